@@ -19,6 +19,7 @@
 
 import re
 import sys
+import time
 import logging
 import logging.handlers
 
@@ -31,8 +32,8 @@ import flask_openid
 import flask_limiter
 import flask_migrate
 
+from . import instrumentation
 from . import logos
-from . import steamid
 from . import util
 from . import config
 
@@ -65,14 +66,17 @@ oid = flask_openid.OpenID(app)
 
 # Setup database connection
 db = flask_sqlalchemy.SQLAlchemy(app)
-from .models import User, Team, GameServer, Match, Tournament, MapStats, PlayerStats  # noqa: E402
+from .models import User, SteamProfile, MetricCounter, Player  # noqa: E402
 migrate = flask_migrate.Migrate(app, db)
 
-# Setup rate limiting
+# Setup rate limiting. Counters are kept in RATELIMIT_STORAGE_URL, which should
+# point at a store shared by all workers (e.g. redis://) in production.
 limiter = flask_limiter.Limiter(
     app,
     key_func=flask_limiter.util.get_remote_address,
     default_limits=['250 per minute'],
+    storage_uri=config_setting('RATELIMIT_STORAGE_URL'),
+    strategy=config_setting('RATELIMIT_STRATEGY'),
 )
 
 # Setup logging
@@ -104,6 +108,9 @@ def register_blueprints():
     from .api import api_blueprint
     app.register_blueprint(api_blueprint)
 
+    from .api_v1 import api_v1_blueprint
+    app.register_blueprint(api_v1_blueprint)
+
     from .tournament import tournament_blueprint
     app.register_blueprint(tournament_blueprint)
 
@@ -116,6 +123,12 @@ def register_blueprints():
     from .server import server_blueprint
     app.register_blueprint(server_blueprint)
 
+    from .search import search_blueprint
+    app.register_blueprint(search_blueprint)
+
+    from .profiler import profiler_blueprint
+    app.register_blueprint(profiler_blueprint)
+
 
 @app.route('/login')
 @oid.loginhandler
@@ -134,11 +147,19 @@ def create_or_login(resp):
         return 'Sorry, you don\'t have access to this webpanel'
 
     g.user = User.get_or_create(steam_id)
-    steamdata = steamid.get_steam_userinfo(
-        g.user.steam_id, app.config['STEAM_API_KEY'])
-    g.user.name = steamdata['personaname']
+    if g.user.name is None:
+        g.user.name = SteamProfile.get_names([steam_id]).get(steam_id)
     db.session.commit()
-    session['user_id'] = g.user.id
+
+    if steam_profiles.refresher is not None:
+        # The persona name is fetched in the background instead of during login.
+        steam_profiles.request_refresh([steam_id])
+    elif g.user.name is None:
+        try:
+            steam_profiles.refresh([steam_id])
+        except Exception as e:
+            app.logger.error('Failed to fetch the steam profile of {}: {}'.format(steam_id, e))
+    set_session_user(g.user)
     return redirect(oid.get_next_url())
 
 
@@ -170,11 +191,40 @@ def application_error(e):
     return 'Sorry, unexpected error: {}'.format(e), 500
 
 
+def set_session_user(user):
+    session['user_id'] = user.id
+    session['user'] = user.get_identity()
+    session['user']['loaded'] = time.time()
+
+
+def load_session_user():
+    """Returns the logged in user.
+
+    The user's columns are kept in the signed session cookie, so the user is
+    only queried again every USER_SESSION_REFRESH seconds. Admins are always
+    queried, so revoking admin rights takes effect immediately.
+    """
+    identity = session.get('user')
+    if (identity and identity.get('id') == session['user_id'] and not identity.get('admin') and
+            time.time() - identity.get('loaded', 0) < config_setting('USER_SESSION_REFRESH')):
+        return User.from_identity(identity)
+
+    user = User.query.get(session['user_id'])
+    if user is None:
+        session.pop('user', None)
+        return None
+    set_session_user(user)
+    return user
+
+
 @app.before_request
 def before_request():
     g.user = None
+    # Plugin callbacks, the public api and static files never use the user.
+    if request.blueprint in ('api', 'api_v1') or request.endpoint == 'static':
+        return
     if 'user_id' in session:
-        g.user = User.query.get(session['user_id'])
+        g.user = load_session_user()
 
 
 @app.before_request
@@ -191,6 +241,7 @@ def log_entry():
 @app.route('/logout')
 def logout():
     session.pop('user_id', None)
+    session.pop('user', None)
     return redirect(oid.get_next_url())
 
 
@@ -211,12 +262,15 @@ def flash_errors(form):
 @app.route('/user/<int:userid>', methods=['GET'])
 def user(userid):
     user = User.query.get_or_404(userid)
-    return render_template('user.html', user=g.user, displaying_user=user)
+    return render_template('user.html', user=g.user, displaying_user=user,
+                           fragment_timeout=config_setting('FRAGMENT_CACHE_TIMEOUT'))
 
 
 @app.route('/metrics', methods=['GET'])
 def metrics():
-    return render_template('metrics.html', user=g.user, values=get_metrics())
+    return render_template('metrics.html', user=g.user, values=get_metrics(),
+                           counters=instrumentation.get_counters(),
+                           timings=instrumentation.get_timings())
 
 
 @cache.cached(timeout=300)
@@ -226,15 +280,40 @@ def get_metrics():
     def add_val(name, value):
         values.append((name, value))
 
-    add_val('Registered users', User.query.count())
-    add_val('Tournaments created', Tournament.query.count())
-    add_val('Saved teams', Team.query.count())
-    add_val('Matches created', Match.query.count())
-    add_val('Servers added', GameServer.query.count())
-    add_val('Maps with stats saved', MapStats.query.count())
-    add_val('Unique players', PlayerStats.query.distinct().count())
-    add_val('Top 10 killers', {player.name: player.kills for player in PlayerStats.query.order_by('kills').limit(10).all()})
+    counters = MetricCounter.get_values()
+    add_val('Registered users', counters.get('users', 0))
+    add_val('Tournaments created', counters.get('tournaments', 0))
+    add_val('Saved teams', counters.get('teams', 0))
+    add_val('Matches created', counters.get('matches', 0))
+    add_val('Servers added', counters.get('servers', 0))
+    add_val('Maps with stats saved', counters.get('maps', 0))
+    add_val('Unique players', counters.get('players', 0))
+    top_killers = Player.get_top_killers(10)
+    add_val('Top 10 killers', ', '.join('{} ({})'.format(player.name or player.steam_id,
+                                                         player.kills)
+                                        for player in top_killers))
 
     return values
 
+
+# Fingerprinted, precompressed static files and compressed pages
+from . import assets  # noqa: E402
+assets.init_app(app)
+
+# Versions for cached template fragments
+from . import fragments  # noqa: E402
+fragments.init_app(app)
+
+# Flags and logos are served as sprite sheets
+from . import sprites  # noqa: E402
+sprites.init_app(app)
+
+# Setup opt-in request profiling
+from . import profiler  # noqa: E402
+profiler.init_app(app)
+
+# Keep steam persona names up to date in the background
+from . import steam_profiles  # noqa: E402
+steam_profiles.init_app(app)
+
 register_blueprints()
@@ -1,9 +1,16 @@
 from get5 import app, limiter, db, BadRequestError
 from .util import as_int
-from .models import Match, MapStats, PlayerStats, GameServer, Tournament, Team
-from . import challonge 
-
-from flask import Blueprint, request
+from .models import (Match, MapStats, PlayerStats, GameServer, Tournament, Team, Player,
+                     HeadToHead, TeamMapStats, MapPoolStats)
+from . import brackets
+from . import challonge
+from . import fragments
+from . import instrumentation
+from . import livescores
+from . import match_keys
+from . import ratings
+
+from flask import Blueprint, request, g
 import flask_limiter
 
 import re
@@ -15,26 +22,122 @@ chall_worker = challonge.ChallongeWorker()
 
 _matchid_re = re.compile('/match/(\d*)/.*')
 
-
-def rate_limit_key():
-    try:
+# PlayerStats columns and the request fields the get5_apistats plugin sends them in.
+PLAYER_STAT_FIELDS = [
+    ('kills', 'kills'),
+    ('assists', 'assists'),
+    ('deaths', 'deaths'),
+    ('flashbang_assists', 'flashbang_assists'),
+    ('teamkills', 'teamkills'),
+    ('suicides', 'suicides'),
+    ('damage', 'damage'),
+    ('headshot_kills', 'headshot_kills'),
+    ('roundsplayed', 'roundsplayed'),
+    ('bomb_plants', 'bomb_plants'),
+    ('bomb_defuses', 'bomb_defuses'),
+    ('k1', '1kill_rounds'),
+    ('k2', '2kill_rounds'),
+    ('k3', '3kill_rounds'),
+    ('k4', '4kill_rounds'),
+    ('k5', '5kill_rounds'),
+    ('v1', 'v1'),
+    ('v2', 'v2'),
+    ('v3', 'v3'),
+    ('v4', 'v4'),
+    ('v5', 'v5'),
+    ('firstkill_t', 'firstkill_t'),
+    ('firstkill_ct', 'firstkill_ct'),
+    ('firstdeath_t', 'firstdeath_t'),
+    ('firstdeath_Ct', 'firstdeath_ct'),
+]
+
+
+def _request_matchid():
+    matchid = (request.view_args or {}).get('matchid')
+    if matchid is None:
         match = _matchid_re.search(request.path)
-        matchid = int(match.group(1))
-        if matchid:
-            # If the key matches, rate limit by the api key
-            api_key = Match.query.get_or_404(matchid).api_key
-            if api_key == request.values.get('key'):
-                return api_key
+        if match and match.group(1):
+            matchid = int(match.group(1))
+    return matchid
+
+
+def _authenticated_match():
+    """Returns (match id, max maps) if the request carries its match's api key.
+
+    Only computed once per request, it's used for both the rate limit key and
+    the size of the budget.
+    """
+    if not hasattr(g, 'rate_limit_match'):
+        g.rate_limit_match = None
+        try:
+            matchid = _request_matchid()
+            key = request.values.get('key')
+            if matchid and match_keys.is_signed(key):
+                # Signed keys are checked without touching the database.
+                claims = match_keys.get_request_claims()
+                if claims and claims[0] == matchid:
+                    g.rate_limit_match = claims
+            elif matchid and key:
+                match = Match.query.get(matchid)
+                if match is not None and match.api_key == key:
+                    g.rate_limit_match = (matchid, match.max_maps or 1)
+        except Exception:
+            pass
+    return g.rate_limit_match
+
 
-    except Exception:
-        pass
+def rate_limit_key():
+    # If the key matches, rate limit by the match.
+    authenticated = _authenticated_match()
+    if authenticated:
+        key = request.values.get('key')
+        if match_keys.is_signed(key):
+            return 'match/{}'.format(authenticated[0])
+        return key
 
     # Otherwise, rate limit by IP address
     return flask_limiter.util.get_remote_address()
 
 
+def match_budget(per_map, period):
+    """Returns a limit that grants per_map requests for each map of the match.
+
+    With elastic expiry the window is extended on every hit, so under steady
+    plugin traffic a budget effectively covers the whole match. Scaling it
+    with max_maps keeps long series (and overtimes) from running out.
+    Requests without the match's key only get the budget of a single map.
+    """
+    def limit():
+        max_maps = 1
+        authenticated = _authenticated_match()
+        if authenticated:
+            max_maps = authenticated[1]
+        return '{} per {}'.format(per_map * max(max_maps, 1), period)
+    return limit
+
+
+def queue_challonge_update(match, **kwargs):
+    """Queues a score update of a tournament match to be sent to Challonge."""
+    if match.tournament_id is None:
+        return
+
+    tournament = Tournament.query.get(match.tournament_id)
+    chall_worker.task_queue.put(
+        ('update_match', (tournament.challonge_id, match.challonge_id), kwargs))
+
+
+@api_blueprint.before_request
+def reject_invalid_signed_keys():
+    # Bad signed keys are turned away before the match is ever loaded.
+    key = request.values.get('key')
+    if match_keys.is_signed(key) and 'matchid' in (request.view_args or {}):
+        claims = match_keys.get_request_claims()
+        if claims is None or claims[0] != request.view_args['matchid']:
+            return 'Wrong API key', 400
+
+
 def match_api_check(request, match):
-    if match.api_key != request.values.get('key'):
+    if not match_keys.check(match, request.values.get('key')):
         raise BadRequestError('Wrong API key')
 
     if match.finalized():
@@ -42,7 +145,7 @@ def match_api_check(request, match):
 
 
 @api_blueprint.route('/match/<int:matchid>/finish', methods=['POST'])
-@limiter.limit('60 per hour', key_func=rate_limit_key)
+@limiter.limit(match_budget(60, 'hour'), key_func=rate_limit_key)
 def match_finish(matchid):
     match = Match.query.get_or_404(matchid)
     match_api_check(request, match)
@@ -55,7 +158,7 @@ def match_finish(matchid):
     else:
         match.winner = None
 
-    forfeit = request.values.get('forfeit', 0)
+    forfeit = as_int(request.values.get('forfeit'))
     if forfeit == 1:
         match.forfeit = True
         # Reassign scores
@@ -67,12 +170,16 @@ def match_finish(matchid):
             match.team2_score = 1
 
     match.end_time = datetime.datetime.utcnow()
-    server = GameServer.query.get(match.server_id)
-    if server:
-        server.in_use = False
+    livescores.flush_match(match)
+    ratings.update_for_match(match)
+    HeadToHead.add_match(match)
+    if match.server_id:
+        server = GameServer.query.get(match.server_id)
+        if server:
+            server.in_use = False
 
     db.session.commit()
-    tournament = Tournament.query.get(match.tournament_id)
+    brackets.invalidate(match.tournament_id)
     scores = match.get_scores()
     if scores:
         scores_csv = ','.join(['{}-{}'.format(s1, s2) for s1, s2 in scores])
@@ -82,15 +189,49 @@ def match_finish(matchid):
         winner_team = Team.query.get(match.winner).challonge_id
     else:
         winner_team = 'tie'
-    chall_worker.task_queue.put(('update_match', (tournament.challonge_id, match.challonge_id), {"scores_csv": scores_csv, "winner_id":winner_team}))
+    queue_challonge_update(match, scores_csv=scores_csv, winner_id=winner_team)
 
     app.logger.info('Finished match {}, winner={}'.format(match, winner))
 
     return 'Success'
 
 
+# The plugin reports a ban as a "veto".
+VETO_ACTIONS = {'pick': 'pick', 'ban': 'ban', 'veto': 'ban'}
+
+
+@api_blueprint.route('/match/<int:matchid>/vetoUpdate', methods=['POST'])
+@limiter.limit(match_budget(30, 'hour'), key_func=rate_limit_key)
+def match_veto_update(matchid):
+    match = Match.query.get_or_404(matchid)
+    match_api_check(request, match)
+
+    team = request.values.get('teamString')
+    action = VETO_ACTIONS.get(request.values.get('pick_or_veto'))
+    map_name = request.values.get('map')
+    if team not in ('team1', 'team2') or action is None:
+        return 'Invalid veto', 400
+    if not map_name or (match.veto_mappool and map_name not in match.veto_mappool.split()):
+        return 'Map not in the veto pool', 400
+
+    try:
+        added = match.add_veto(team, action, map_name)
+    except ValueError as e:
+        app.logger.error('Veto of match {} not recorded: {}'.format(matchid, e))
+        return str(e), 400
+
+    if added:
+        team_id = match.team1_id if team == 'team1' else match.team2_id
+        if team_id is not None:
+            TeamMapStats.add_veto(team_id, map_name, action)
+        MapPoolStats.add_veto(map_name, action)
+        db.session.commit()
+
+    return 'Success'
+
+
 @api_blueprint.route('/match/<int:matchid>/map/<int:mapnumber>/start', methods=['POST'])
-@limiter.limit('60 per hour', key_func=rate_limit_key)
+@limiter.limit(match_budget(60, 'hour'), key_func=rate_limit_key)
 def match_map_start(matchid, mapnumber):
     match = Match.query.get_or_404(matchid)
     match_api_check(request, match)
@@ -103,12 +244,13 @@ def match_map_start(matchid, mapnumber):
     # Create mapstats object if needed
     MapStats.get_or_create(matchid, mapnumber, map_name)
     db.session.commit()
+    brackets.invalidate(match.tournament_id)
 
     return 'Success'
 
 
 @api_blueprint.route('/match/<int:matchid>/map/<int:mapnumber>/update', methods=['POST'])
-@limiter.limit('1000 per hour', key_func=rate_limit_key)
+@limiter.limit(match_budget(1000, 'hour'), key_func=rate_limit_key)
 def match_map_update(matchid, mapnumber):
     match = Match.query.get_or_404(matchid)
     match_api_check(request, match)
@@ -118,11 +260,13 @@ def match_map_update(matchid, mapnumber):
         t1 = as_int(request.values.get('team1score'))
         t2 = as_int(request.values.get('team2score'))
         if t1 != -1 and t2 != -1:
-            map_stats.team1_score = t1
-            map_stats.team2_score = t2
-            db.session.commit()
-            tournament = Tournament.query.get(match.tournament_id)
-            chall_worker.task_queue.put(('update_match', (tournament.challonge_id, match.challonge_id), {"scores_csv": "{}-{}".format(t1,t2)}))
+            # Scores and timeline rows are buffered and only written out every
+            # few rounds, viewers read them from the buffer in the meantime.
+            flushed = livescores.update(map_stats, t1, t2)
+            if flushed:
+                db.session.commit()
+                queue_challonge_update(match, scores_csv='{}-{}'.format(t1, t2))
+                brackets.invalidate(match.tournament_id)
     else:
         return 'Failed to find map stats object', 400
 
@@ -130,13 +274,23 @@ def match_map_update(matchid, mapnumber):
 
 
 @api_blueprint.route('/match/<int:matchid>/map/<int:mapnumber>/finish', methods=['POST'])
-@limiter.limit('60 per hour', key_func=rate_limit_key)
+@limiter.limit(match_budget(60, 'hour'), key_func=rate_limit_key)
 def match_map_finish(matchid, mapnumber):
     match = Match.query.get_or_404(matchid)
     match_api_check(request, match)
 
     map_stats = match.map_stats.filter_by(map_number=mapnumber).first()
     if map_stats:
+        livescores.flush(map_stats)
+        # The final score, when sent, wins over whatever the buffer held.
+        t1 = as_int(request.values.get('team1score'))
+        t2 = as_int(request.values.get('team2score'))
+        if t1 != -1 and t2 != -1:
+            map_stats.team1_score = t1
+            map_stats.team2_score = t2
+
+        # Retried requests must not count the map twice.
+        first_finish = map_stats.end_time is None
         map_stats.end_time = datetime.datetime.utcnow()
 
         winner = request.values.get('winner')
@@ -149,7 +303,10 @@ def match_map_finish(matchid, mapnumber):
         else:
             map_stats.winner = None
 
+        if first_finish:
+            map_stats.add_to_rollups()
         db.session.commit()
+        brackets.invalidate(match.tournament_id)
     else:
         return 'Failed to find map stats object', 404
 
@@ -159,60 +316,51 @@ def match_map_finish(matchid, mapnumber):
 @api_blueprint.route(
     '/match/<int:matchid>/map/<int:mapnumber>/player/<steamid64>/update',
     methods=['POST'])
-@limiter.limit('100 per minute', key_func=rate_limit_key)
+@limiter.limit(match_budget(3000, 'hour'), key_func=rate_limit_key)
 def match_map_update_player(matchid, mapnumber, steamid64):
     match = Match.query.get_or_404(matchid)
-    api_key = request.values.get('key')
-    if match.api_key != api_key:
+    if not match_keys.check(match, request.values.get('key')):
         return 'Wrong API key', 400
 
     map_stats = match.map_stats.filter_by(map_number=mapnumber).first()
     if map_stats:
         player_stats = PlayerStats.get_or_create(matchid, mapnumber, steamid64)
         if player_stats:
-            player_stats.name = request.values.get('name')
+            values = {'name': request.values.get('name')}
             team = request.values.get('team')
             if team == 'team1':
-                player_stats.team_id = match.team1_id
+                values['team_id'] = match.team1_id
             elif team == 'team2':
-                player_stats.team_id = match.team2_id
-
-            player_stats.kills = as_int(request.values.get('kills'))
-            player_stats.assists = as_int(request.values.get('assists'))
-            player_stats.deaths = as_int(request.values.get('deaths'))
-            player_stats.flashbang_assists = as_int(
-                request.values.get('flashbang_assists'))
-            player_stats.teamkills = as_int(request.values.get('teamkills'))
-            player_stats.suicides = as_int(request.values.get('suicides'))
-            player_stats.damage = as_int(request.values.get('damage'))
-            player_stats.headshot_kills = as_int(
-                request.values.get('headshot_kills'))
-            player_stats.roundsplayed = as_int(
-                request.values.get('roundsplayed'))
-            player_stats.bomb_plants = as_int(
-                request.values.get('bomb_plants'))
-            player_stats.bomb_defuses = as_int(
-                request.values.get('bomb_defuses'))
-            player_stats.k1 = as_int(request.values.get('1kill_rounds'))
-            player_stats.k2 = as_int(request.values.get('2kill_rounds'))
-            player_stats.k3 = as_int(request.values.get('3kill_rounds'))
-            player_stats.k4 = as_int(request.values.get('4kill_rounds'))
-            player_stats.k5 = as_int(request.values.get('5kill_rounds'))
-            player_stats.v1 = as_int(request.values.get('v1'))
-            player_stats.v2 = as_int(request.values.get('v2'))
-            player_stats.v3 = as_int(request.values.get('v3'))
-            player_stats.v4 = as_int(request.values.get('v4'))
-            player_stats.v5 = as_int(request.values.get('v5'))
-            player_stats.firstkill_t = as_int(
-                request.values.get('firstkill_t'))
-            player_stats.firstkill_ct = as_int(
-                request.values.get('firstkill_ct'))
-            player_stats.firstdeath_t = as_int(
-                request.values.get('firstdeath_t'))
-            player_stats.firstdeath_ct = as_int(
-                request.values.get('firstdeath_ct'))
-
+                values['team_id'] = match.team2_id
+
+            for column, field in PLAYER_STAT_FIELDS:
+                values[column] = as_int(request.values.get(field))
+
+            # Most mid-round updates (e.g. for dead players) change nothing,
+            # so only touch the columns that differ and skip the commit
+            # entirely when none do.
+            changed = {column: value for column, value in values.items()
+                       if getattr(player_stats, column) != value}
+            if not changed:
+                instrumentation.increment('Player stat updates (unchanged)')
+                return 'Success'
+
+            # Keep the career totals in step, in the same transaction.
+            if 'kills' in changed or 'name' in changed:
+                kills = 0
+                if 'kills' in changed:
+                    kills = (changed['kills'] or 0) - (player_stats.kills or 0)
+                Player.add_stats(steamid64, changed.get('name'), kills)
+
+            for column, value in changed.items():
+                setattr(player_stats, column, value)
+            player_stats.clear_derived()
             db.session.commit()
+            instrumentation.increment('Player stat updates (written)')
+
+            # Scoreboards of finished maps are cached until they change.
+            if map_stats.end_time is not None:
+                fragments.invalidate('map_stats', map_stats.id)
     else:
         return 'Failed to find map stats object', 404
 
@@ -1,7 +1,15 @@
 import unittest
+from unittest import mock
 
+import get5
+from get5 import db
 from . import get5_test
-from .models import Match, MapStats, PlayerStats, GameServer
+from . import instrumentation
+from . import livescores
+from . import match_keys
+from . import profiler
+from .models import (Match, MapStats, PlayerStats, GameServer, Player, MetricCounter,
+                     TeamMapStats, MapPoolStats)
 
 
 class ApiTests(get5_test.Get5Test):
@@ -115,6 +123,144 @@ class ApiTests(get5_test.Get5Test):
         self.assertEqual(self.app.get('/matches').status_code, 200)
         self.assertEqual(self.app.get('/matches/1').status_code, 200)
 
+    def test_player_update_unchanged(self):
+        match = Match.query.get(1)
+        data = {'mapname': 'de_dust2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+
+        data = {
+            'name': 'player',
+            'team': 'team1',
+            'kills': '3',
+            'firstdeath_ct': '1',
+            'key': match.api_key,
+        }
+        url = '/match/1/map/0/player/76561198053858673/update'
+        self.assertEqual(self.app.post(url, data=data).status_code, 200)
+        unchanged = dict(instrumentation.get_counters()).get('Player stat updates (unchanged)', 0)
+
+        # Sending identical values again should not write anything
+        self.assertEqual(self.app.post(url, data=data).status_code, 200)
+        counters = dict(instrumentation.get_counters())
+        self.assertEqual(counters['Player stat updates (unchanged)'], unchanged + 1)
+
+        playerstats = PlayerStats.query.filter_by(match_id=1, steam_id='76561198053858673').one()
+        self.assertEqual(playerstats.kills, 3)
+        self.assertEqual(playerstats.firstdeath_Ct, 1)
+
+        # A single changed field is still saved
+        data['kills'] = '4'
+        self.assertEqual(self.app.post(url, data=data).status_code, 200)
+        playerstats = PlayerStats.query.filter_by(match_id=1, steam_id='76561198053858673').one()
+        self.assertEqual(playerstats.kills, 4)
+
+    def test_player_totals(self):
+        match = Match.query.get(1)
+        match.max_maps = 3
+        db.session.commit()
+        url = '/match/1/map/{}/player/76561198053858673/update'
+        for mapnumber, kills in [(0, '5'), (1, '7')]:
+            data = {'mapname': 'de_dust2', 'key': match.api_key}
+            start_url = '/match/1/map/{}/start'.format(mapnumber)
+            self.assertEqual(self.app.post(start_url, data=data).status_code, 200)
+            data = {'name': 'player', 'team': 'team1', 'kills': '2', 'key': match.api_key}
+            self.assertEqual(self.app.post(url.format(mapnumber), data=data).status_code, 200)
+            data['kills'] = kills
+            self.assertEqual(self.app.post(url.format(mapnumber), data=data).status_code, 200)
+
+        player = Player.query.get('76561198053858673')
+        self.assertEqual(player.name, 'player')
+        self.assertEqual(player.kills, 12)
+        self.assertEqual(Player.get_top_killers(), [player])
+
+        counters = MetricCounter.get_values()
+        self.assertEqual(counters['players'], 1)
+        self.assertEqual(counters['maps'], 2)
+        self.assertEqual(counters['matches'], 1)
+        self.assertEqual(self.app.get('/metrics').status_code, 200)
+
+    def test_live_score_buffer(self):
+        match = Match.query.get(1)
+        data = {'mapname': 'de_dust2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+
+        # The first update is written out right away
+        data = {'team1score': '1', 'team2score': '0', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/update', data=data).status_code, 200)
+        mapstat = MapStats.query.filter_by(match_id=1, map_number=0).first()
+        self.assertEqual((mapstat.team1_score, mapstat.team2_score), (1, 0))
+
+        # The next one is only buffered, but still visible to viewers
+        data = {'team1score': '2', 'team2score': '0', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/update', data=data).status_code, 200)
+        mapstat = MapStats.query.filter_by(match_id=1, map_number=0).first()
+        self.assertEqual((mapstat.team1_score, mapstat.team2_score), (1, 0))
+        self.assertEqual(mapstat.get_live_score(), (2, 0))
+        self.assertEqual(Match.query.get(1).get_current_score(), (2, 0))
+
+        # Finishing the map always writes the final score
+        data = {'winner': 'team1', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/finish', data=data).status_code, 200)
+        mapstat = MapStats.query.filter_by(match_id=1, map_number=0).first()
+        self.assertEqual((mapstat.team1_score, mapstat.team2_score), (2, 0))
+
+    def test_map_finish_final_score(self):
+        key = Match.query.get(1).api_key
+        data = {'mapname': 'de_dust2', 'key': key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+        for score in ['1', '2']:
+            data = {'team1score': score, 'team2score': '0', 'key': key}
+            self.assertEqual(self.app.post('/match/1/map/0/update', data=data).status_code, 200)
+
+        # The score sent with the finish is written even if the buffer is gone
+        mapstat = MapStats.query.filter_by(match_id=1, map_number=0).first()
+        get5.cache.delete(livescores._key(mapstat))
+        data = {'winner': 'team1', 'team1score': '3', 'team2score': '0', 'key': key}
+        self.assertEqual(self.app.post('/match/1/map/0/finish', data=data).status_code, 200)
+        mapstat = MapStats.query.filter_by(match_id=1, map_number=0).first()
+        self.assertEqual((mapstat.team1_score, mapstat.team2_score), (3, 0))
+
+    def test_live_score_flushed_on_cancel(self):
+        key = Match.query.get(1).api_key
+        data = {'mapname': 'de_dust2', 'key': key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+        for score in ['1', '2']:
+            data = {'team1score': score, 'team2score': '0', 'key': key}
+            self.assertEqual(self.app.post('/match/1/map/0/update', data=data).status_code, 200)
+
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 1
+            self.assertEqual(c.get('/match/1/cancel').status_code, 302)
+
+        mapstat = MapStats.query.filter_by(match_id=1, map_number=0).first()
+        self.assertEqual((mapstat.team1_score, mapstat.team2_score), (2, 0))
+
+    def test_finished_map_scoreboard_cached(self):
+        match = Match.query.get(1)
+        data = {'mapname': 'de_dust2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+
+        url = '/match/1/map/0/player/76561198053858673/update'
+        data = {'name': 'firstname', 'team': 'team1', 'roundsplayed': '1', 'key': match.api_key}
+        self.assertEqual(self.app.post(url, data=data).status_code, 200)
+        finish_data = {'winner': 'team1', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/finish', data=finish_data).status_code, 200)
+        with profiler.QueryCounter() as first_render:
+            self.assertIn(b'firstname', self.app.get('/match/1').data)
+
+        # Rendering again serves the scoreboard from the cache
+        with profiler.QueryCounter() as cached_render:
+            self.assertIn(b'firstname', self.app.get('/match/1').data)
+        self.assertTrue([x for x in first_render.statements if 'player_stats' in x])
+        self.assertGreater(cached_render.count, 0)
+        self.assertFalse([x for x in cached_render.statements if 'player_stats' in x])
+
+        # A late stat update still shows up
+        data['name'] = 'secondname'
+        self.assertEqual(self.app.post(url, data=data).status_code, 200)
+        self.assertIn(b'secondname', self.app.get('/match/1').data)
+
     def test_match_stats_wrong_api_key(self):
         self.assertEqual(self.app.get('/match/1').status_code, 200)
         self.assertEqual(self.app.get('/matches').status_code, 200)
@@ -139,6 +285,29 @@ class ApiTests(get5_test.Get5Test):
         self.assertEqual(response.status_code, 400)
         self.assertIn('Wrong API key', response.get_data().decode('utf8'))
 
+    def test_signed_api_key(self):
+        match = Match.query.get(1)
+        key = match_keys.issue(match)
+        self.assertEqual(match_keys.verify(key), (1, 1))
+        data = {'mapname': 'de_dust2', 'key': key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+
+        # Keys of other matches, tampered and expired keys are rejected
+        other_match = Match(id=2, max_maps=1)
+        tampered = key[:-1] + ('A' if key[-1] != 'A' else 'B')
+        with mock.patch.dict(get5.app.config, {'MATCH_KEY_LIFETIME': -10}):
+            expired = match_keys.issue(match)
+
+        with profiler.QueryCounter() as queries:
+            for bad_key in [match_keys.issue(other_match), tampered, expired]:
+                data = {'team1score': '1', 'team2score': '0', 'key': bad_key}
+                response = self.app.post('/match/1/map/0/update', data=data)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('Wrong API key', response.get_data().decode('utf8'))
+
+        # ...without loading the match
+        self.assertEqual(queries.count, 0)
+
     def test_rate_limiting(self):
         match = Match.query.get(1)
         data = {
@@ -155,6 +324,35 @@ class ApiTests(get5_test.Get5Test):
 
         self.assertEqual(response.status_code, 429)  # too many requests
 
+    def test_rate_limiting_scales_with_max_maps(self):
+        match = Match.query.get(1)
+        match.max_maps = 3
+        db.session.commit()
+        data = {
+            'key': match.api_key,
+        }
+
+        # a bo3 gets three times the budget of a bo1
+        for i in range(100):
+            response = self.app.post('/match/1/map/0/start', data=data)
+        self.assertEqual(response.status_code, 200)
+
+        for i in range(100):
+            response = self.app.post('/match/1/map/0/start', data=data)
+        self.assertEqual(response.status_code, 429)
+
+    def test_rate_limiting_wrong_key_base_budget(self):
+        match = Match.query.get(1)
+        match.max_maps = 3
+        db.session.commit()
+
+        # Requests without the match's key get the 60 per hour of a bo1, not 180
+        for i in range(60):
+            response = self.app.post('/match/1/map/0/start', data={'key': 'wrong'})
+            self.assertEqual(response.status_code, 400)
+        response = self.app.post('/match/1/map/0/start', data={'key': 'wrong'})
+        self.assertEqual(response.status_code, 429)
+
     def test_rate_limiting_different_keys(self):
         match = Match.query.get(1)
         data = {
@@ -174,6 +372,42 @@ class ApiTests(get5_test.Get5Test):
 
         self.assertEqual(response.status_code, 429)  # too many requests
 
+    def test_veto_update(self):
+        key = Match.query.get(1).api_key
+        vetoes = [('team1', 'veto', 'de_cache'), ('team2', 'veto', 'de_mirage'),
+                  ('team1', 'pick', 'de_dust2'), ('team1', 'pick', 'de_dust2')]
+        for team, action, map_name in vetoes:
+            data = {'teamString': team, 'pick_or_veto': action, 'map': map_name, 'key': key}
+            self.assertEqual(self.app.post('/match/1/vetoUpdate', data=data).status_code, 200)
+
+        data = {'teamString': 'team1', 'pick_or_veto': 'pick', 'map': 'de_nuke', 'key': key}
+        self.assertEqual(self.app.post('/match/1/vetoUpdate', data=data).status_code, 400)
+
+        # The retried pick is only recorded once
+        match = Match.query.get(1)
+        self.assertEqual(match.veto_log, '1b:de_cache 2b:de_mirage 1p:de_dust2')
+
+        # Vetoes that don't fit the log are reported instead of dropped
+        match.veto_mappool = None
+        db.session.commit()
+        data = {'teamString': 'team2', 'pick_or_veto': 'veto', 'map': 'x' * 400, 'key': key}
+        response = self.app.post('/match/1/vetoUpdate', data=data)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Veto log is full', response.get_data().decode('utf8'))
+
+        match = Match.query.get(1)
+        self.assertEqual(match.veto_log, '1b:de_cache 2b:de_mirage 1p:de_dust2')
+        self.assertEqual(match.get_vetoes()[1],
+                         {'team': 'team2', 'action': 'ban', 'map': 'de_mirage'})
+
+        stats = TeamMapStats.query.get((1, 'de_dust2'))
+        self.assertEqual((stats.picks, stats.bans), (1, 0))
+        self.assertEqual(TeamMapStats.query.get((2, 'de_mirage')).bans, 1)
+        self.assertEqual(MapPoolStats.query.get('de_cache').bans, 1)
+        self.assertEqual(TeamMapStats.get_veto_rates(TeamMapStats.get_for_team(1)),
+                         {'de_dust2': (1.0, 0.0), 'de_cache': (0.0, 1.0)})
+        self.assertEqual(self.app.get('/match/1').status_code, 200)
+
 
 if __name__ == '__main__':
     unittest.main()
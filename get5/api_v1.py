@@ -0,0 +1,330 @@
+import hashlib
+import json
+
+from get5 import BadRequestError, config_setting
+from .models import (Match, Team, Tournament, MapStats, PlayerStats, RoundSnapshot,
+                     TeamMapStats, MapPoolStats, HeadToHead)
+from . import livescores
+from . import search
+from . import util
+
+from flask import Blueprint, request, current_app
+
+api_v1_blueprint = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def _isoformat(value):
+    if value is None:
+        return None
+    return value.isoformat()
+
+
+def _state(obj):
+    if obj.cancelled:
+        return 'cancelled'
+    elif obj.pending():
+        return 'pending'
+    elif obj.live():
+        return 'live'
+    else:
+        return 'finished'
+
+
+# Each resource maps its public field names to getters. Anything not listed
+# here (api keys, rcon passwords, ...) is never exposed through the api.
+MATCH_FIELDS = {
+    'id': lambda m: m.id,
+    'title': lambda m: m.title,
+    'state': _state,
+    'tournament_id': lambda m: m.tournament_id,
+    'server_id': lambda m: m.server_id,
+    'team1_id': lambda m: m.team1_id,
+    'team2_id': lambda m: m.team2_id,
+    'team1_score': lambda m: m.team1_score,
+    'team2_score': lambda m: m.team2_score,
+    'winner': lambda m: m.winner,
+    'forfeit': lambda m: bool(m.forfeit),
+    'max_maps': lambda m: m.max_maps,
+    'veto_mappool': lambda m: m.veto_mappool.split() if m.veto_mappool else [],
+    'vetoes': lambda m: m.get_vetoes(),
+    'start_time': lambda m: _isoformat(m.start_time),
+    'end_time': lambda m: _isoformat(m.end_time),
+}
+
+TEAM_FIELDS = {
+    'id': lambda t: t.id,
+    'name': lambda t: t.name,
+    'tag': lambda t: t.tag,
+    'flag': lambda t: t.flag,
+    'logo': lambda t: t.logo,
+    'public_team': lambda t: bool(t.public_team),
+    'players': lambda t: [x for x in t.auths if x] if t.auths else [],
+}
+
+TOURNAMENT_FIELDS = {
+    'id': lambda t: t.id,
+    'name': lambda t: t.name,
+    'url': lambda t: t.url,
+    'state': _state,
+    'challonge_id': lambda t: t.challonge_id,
+    'winner': lambda t: t.winner,
+    'veto_mappool': lambda t: t.veto_mappool.split() if t.veto_mappool else [],
+    'start_time': lambda t: _isoformat(t.start_time),
+    'end_time': lambda t: _isoformat(t.end_time),
+}
+
+MAP_FIELDS = {
+    'id': lambda m: m.id,
+    'map_number': lambda m: m.map_number,
+    'map_name': lambda m: m.map_name,
+    'team1_score': lambda m: m.get_live_score()[0],
+    'team2_score': lambda m: m.get_live_score()[1],
+    'winner': lambda m: m.winner,
+    'start_time': lambda m: _isoformat(m.start_time),
+    'end_time': lambda m: _isoformat(m.end_time),
+}
+
+TEAM_MAP_FIELDS = {
+    'map_name': lambda r: r.map_name,
+    'wins': lambda r: r.wins,
+    'losses': lambda r: r.losses,
+    'rounds_won': lambda r: r.rounds_won,
+    'rounds_lost': lambda r: r.rounds_lost,
+    'last_played': lambda r: _isoformat(r.last_played),
+    'picks': lambda r: r.picks,
+    'bans': lambda r: r.bans,
+}
+
+MAP_POOL_FIELDS = {
+    'map_name': lambda r: r.map_name,
+    'played': lambda r: r.played,
+    'last_played': lambda r: _isoformat(r.last_played),
+    'picks': lambda r: r.picks,
+    'bans': lambda r: r.bans,
+}
+
+PLAYER_STAT_COLUMNS = [
+    'steam_id', 'name', 'team_id', 'kills', 'deaths', 'assists', 'roundsplayed',
+    'flashbang_assists', 'teamkills', 'suicides', 'headshot_kills', 'damage',
+    'bomb_plants', 'bomb_defuses', 'v1', 'v2', 'v3', 'v4', 'v5',
+    'k1', 'k2', 'k3', 'k4', 'k5',
+]
+
+TIMELINE_COLUMNS = [
+    'round_number', 'team1_score', 'team2_score', 'seconds',
+]
+
+
+def get_fields(available):
+    """Returns the field names requested through ?fields=a,b,c, or all fields."""
+    requested = request.values.get('fields')
+    if not requested:
+        return sorted(available.keys())
+
+    fields = [f.strip() for f in requested.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available]
+    if unknown:
+        raise BadRequestError('Unknown fields: {}'.format(', '.join(unknown)))
+    return fields
+
+
+def serialize(obj, available, fields):
+    return {field: available[field](obj) for field in fields}
+
+
+def serialize_player_stats(player_stats):
+    d = {column: getattr(player_stats, column) for column in PLAYER_STAT_COLUMNS}
+    if player_stats.roundsplayed:
+        d['rating'] = round(player_stats.get_rating(), 3)
+    else:
+        d['rating'] = None
+    d['adr'] = round(player_stats.get_adr(), 1)
+    d['hsp'] = round(player_stats.get_hsp(), 3)
+    return d
+
+
+def paginate(query, model, available):
+    """Keyset pagination over descending ids.
+
+    The client passes back the returned ``next_cursor`` as ``?cursor=`` to get
+    the following page, which is a single indexed range scan no matter how
+    deep into the listing it is.
+    """
+    limit = util.as_int(request.values.get('limit'), on_fail=DEFAULT_PAGE_SIZE)
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    fields = get_fields(available)
+
+    cursor = util.as_int(request.values.get('cursor'), on_fail=None)
+    if cursor is not None:
+        query = query.filter(model.id < cursor)
+
+    rows = query.order_by(model.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = rows[-1].id
+
+    return {
+        'data': [serialize(row, available, fields) for row in rows],
+        'next_cursor': next_cursor,
+    }
+
+
+def json_response(payload, max_age=None):
+    """Builds a cacheable json response.
+
+    The ETag is derived from the body so pollers sending If-None-Match get an
+    empty 304 back while nothing changed.
+    """
+    if max_age is None:
+        max_age = config_setting('API_CACHE_MAX_AGE')
+
+    body = json.dumps(payload, sort_keys=True, separators=(',', ':'))
+    response = current_app.response_class(body, mimetype='application/json')
+    response.set_etag(hashlib.md5(body.encode('utf8')).hexdigest())
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response.make_conditional(request)
+
+
+@api_v1_blueprint.route('/matches', methods=['GET'])
+def matches():
+    query = Match.query.filter_by(cancelled=False)
+    tournament_id = util.as_int(request.values.get('tournament_id'), on_fail=None)
+    if tournament_id is not None:
+        query = query.filter_by(tournament_id=tournament_id)
+    return json_response(paginate(query, Match, MATCH_FIELDS))
+
+
+@api_v1_blueprint.route('/matches/<int:matchid>', methods=['GET'])
+def match(matchid):
+    match = Match.query.get_or_404(matchid)
+    return json_response(serialize(match, MATCH_FIELDS, get_fields(MATCH_FIELDS)))
+
+
+@api_v1_blueprint.route('/match/<int:matchid>/stats', methods=['GET'])
+def match_stats(matchid):
+    match = Match.query.get_or_404(matchid)
+    map_stat_list = match.map_stats.order_by(MapStats.map_number).all()
+
+    # Load every player row of the match at once instead of per map.
+    players_by_map = {}
+    for player_stats in PlayerStats.query.filter_by(match_id=matchid).order_by(PlayerStats.id):
+        players_by_map.setdefault(player_stats.map_id, []).append(
+            serialize_player_stats(player_stats))
+
+    maps = []
+    for map_stats in map_stat_list:
+        d = serialize(map_stats, MAP_FIELDS, sorted(MAP_FIELDS.keys()))
+        d['players'] = players_by_map.get(map_stats.id, [])
+        maps.append(d)
+
+    payload = serialize(match, MATCH_FIELDS, get_fields(MATCH_FIELDS))
+    payload['maps'] = maps
+
+    # Stats of a finalized match never change again.
+    max_age = None
+    if match.finalized():
+        max_age = config_setting('API_CACHE_MAX_AGE_FINALIZED')
+    return json_response(payload, max_age)
+
+
+@api_v1_blueprint.route('/matches/<int:matchid>/maps/<int:mapnumber>/timeline', methods=['GET'])
+def map_timeline(matchid, mapnumber):
+    match = Match.query.get_or_404(matchid)
+    map_stats = match.map_stats.filter_by(map_number=mapnumber).first_or_404()
+
+    # Rounds are returned as rows of TIMELINE_COLUMNS to keep polling cheap.
+    rounds = [[getattr(snapshot, column) for column in TIMELINE_COLUMNS]
+              for snapshot in RoundSnapshot.get_timeline(map_stats.id)]
+    # Rounds of a live map since the last flush are still in the buffer.
+    recorded = rounds[-1][0] if rounds else 0
+    rounds += [[r[column] for column in TIMELINE_COLUMNS]
+               for r in livescores.get_pending_rounds(map_stats) if r['round_number'] > recorded]
+    payload = {
+        'match_id': match.id,
+        'map_number': map_stats.map_number,
+        'map_name': map_stats.map_name,
+        'columns': TIMELINE_COLUMNS,
+        'rounds': rounds,
+    }
+
+    max_age = None
+    if map_stats.end_time is not None:
+        max_age = config_setting('API_CACHE_MAX_AGE_FINALIZED')
+    return json_response(payload, max_age)
+
+
+@api_v1_blueprint.route('/teams', methods=['GET'])
+def teams():
+    return json_response(paginate(Team.query, Team, TEAM_FIELDS))
+
+
+@api_v1_blueprint.route('/teams/<int:teamid>', methods=['GET'])
+def team(teamid):
+    team = Team.query.get_or_404(teamid)
+    return json_response(serialize(team, TEAM_FIELDS, get_fields(TEAM_FIELDS)))
+
+
+@api_v1_blueprint.route('/teams/<int:teamid>/maps', methods=['GET'])
+def team_maps(teamid):
+    team = Team.query.get_or_404(teamid)
+    fields = sorted(TEAM_MAP_FIELDS.keys())
+    results = TeamMapStats.get_for_team(team.id)
+    veto_rates = TeamMapStats.get_veto_rates(results)
+
+    data = []
+    for r in results:
+        d = serialize(r, TEAM_MAP_FIELDS, fields)
+        d['pick_rate'] = round(veto_rates[r.map_name][0], 3)
+        d['ban_rate'] = round(veto_rates[r.map_name][1], 3)
+        data.append(d)
+    return json_response({'team_id': team.id, 'data': data})
+
+
+@api_v1_blueprint.route('/teams/<int:teamid>/vs/<int:otherid>', methods=['GET'])
+def team_vs(teamid, otherid):
+    team = Team.query.get_or_404(teamid)
+    other_team = Team.query.get_or_404(otherid)
+    record = HeadToHead.get_record(team.id, other_team.id)
+    if record is None:
+        record = {'series_won': 0, 'series_lost': 0, 'series_drawn': 0,
+                  'maps_won': 0, 'maps_lost': 0, 'last_match_id': None, 'last_played': None}
+    record['last_played'] = _isoformat(record['last_played'])
+    record['team_id'] = team.id
+    record['other_team_id'] = other_team.id
+    return json_response(record)
+
+
+@api_v1_blueprint.route('/maps', methods=['GET'])
+def maps():
+    fields = sorted(MAP_POOL_FIELDS.keys())
+    return json_response(
+        {'data': [serialize(r, MAP_POOL_FIELDS, fields) for r in MapPoolStats.get_popularity()]})
+
+
+@api_v1_blueprint.route('/search', methods=['GET'])
+def search_results():
+    results = search.search(request.values.get('q', ''))
+    return json_response({
+        'teams': [serialize(t, TEAM_FIELDS, ['id', 'name', 'tag']) for t in results['teams']],
+        'players': [{'steam_id': p.steam_id, 'name': p.name} for p in results['players']],
+        'matches': [serialize(m, MATCH_FIELDS, ['id', 'title', 'state'])
+                    for m in results['matches']],
+    })
+
+
+@api_v1_blueprint.route('/tournaments', methods=['GET'])
+def tournaments():
+    query = Tournament.query.filter_by(cancelled=False)
+    return json_response(paginate(query, Tournament, TOURNAMENT_FIELDS))
+
+
+@api_v1_blueprint.route('/tournaments/<int:tournamentid>', methods=['GET'])
+def tournament(tournamentid):
+    tournament = Tournament.query.get_or_404(tournamentid)
+    return json_response(
+        serialize(tournament, TOURNAMENT_FIELDS, get_fields(TOURNAMENT_FIELDS)))
@@ -0,0 +1,118 @@
+import json
+import unittest
+
+from . import get5_test
+from get5 import db
+from .models import User, Team, Match, RoundSnapshot
+
+
+class ApiV1Tests(get5_test.Get5Test):
+
+    def get_json(self, url):
+        response = self.app.get(url)
+        self.assertEqual(response.status_code, 200)
+        return json.loads(response.get_data().decode('utf8'))
+
+    def test_matches(self):
+        data = self.get_json('/api/v1/matches')
+        self.assertEqual(len(data['data']), 1)
+        self.assertEqual(data['data'][0]['id'], 1)
+        self.assertEqual(data['data'][0]['state'], 'pending')
+        self.assertNotIn('api_key', data['data'][0])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_match_stats(self):
+        data = self.get_json('/api/v1/match/1/stats')
+        self.assertEqual(data['id'], 1)
+        self.assertEqual(data['maps'], [])
+        self.assertEqual(self.app.get('/api/v1/match/100/stats').status_code, 404)
+
+    def test_sparse_fields(self):
+        data = self.get_json('/api/v1/teams?fields=id,name')
+        self.assertEqual(data['data'][0], {'id': 2, 'name': 'Fnatic'})
+
+        response = self.app.get('/api/v1/teams?fields=id,rcon_password')
+        self.assertEqual(response.status_code, 400)
+
+    def test_keyset_pagination(self):
+        user = User.query.get(1)
+        for i in range(5):
+            Team.create(user, 'Team {}'.format(i), 'T', 'se', '', None)
+        db.session.commit()
+
+        data = self.get_json('/api/v1/teams?limit=3&fields=id')
+        self.assertEqual([t['id'] for t in data['data']], [7, 6, 5])
+        self.assertEqual(data['next_cursor'], 5)
+
+        data = self.get_json('/api/v1/teams?limit=3&fields=id&cursor=5')
+        self.assertEqual([t['id'] for t in data['data']], [4, 3, 2])
+
+        data = self.get_json('/api/v1/teams?limit=3&fields=id&cursor=2')
+        self.assertEqual([t['id'] for t in data['data']], [1])
+        self.assertIsNone(data['next_cursor'])
+
+    def test_etag(self):
+        response = self.app.get('/api/v1/matches/1')
+        self.assertEqual(response.status_code, 200)
+        etag = response.headers['ETag']
+        self.assertIn('max-age', response.headers['Cache-Control'])
+
+        response = self.app.get('/api/v1/matches/1', headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.get_data(), b'')
+
+    def test_map_timeline(self):
+        key = Match.query.get(1).api_key
+        data = {'mapname': 'de_dust2', 'key': key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+
+        # Repeated updates for the same round only add one row
+        for t1, t2 in [(1, 0), (1, 0), (1, 1)]:
+            data = {'team1score': str(t1), 'team2score': str(t2), 'key': key}
+            self.assertEqual(self.app.post('/match/1/map/0/update', data=data).status_code, 200)
+
+        data = self.get_json('/api/v1/matches/1/maps/0/timeline')
+        self.assertEqual(data['map_name'], 'de_dust2')
+        rounds = [dict(zip(data['columns'], row)) for row in data['rounds']]
+        self.assertEqual([r['round_number'] for r in rounds], [1, 2])
+        self.assertEqual([(r['team1_score'], r['team2_score']) for r in rounds],
+                         [(1, 0), (1, 1)])
+
+        # Only the first round is written right away, the others on the next flush
+        self.assertEqual(len(RoundSnapshot.get_timeline(1)), 1)
+        data = {'winner': 'team1', 'key': key}
+        self.assertEqual(self.app.post('/match/1/map/0/finish', data=data).status_code, 200)
+        self.assertEqual([r.round_number for r in RoundSnapshot.get_timeline(1)], [1, 2])
+
+        self.assertEqual(self.app.get('/api/v1/matches/1/maps/1/timeline').status_code, 404)
+
+    def test_map_results(self):
+        match = Match.query.get(1)
+        data = {'mapname': 'de_dust2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+        data = {'team1score': '16', 'team2score': '10', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/update', data=data).status_code, 200)
+
+        # A retried finish is only counted once
+        data = {'winner': 'team1', 'key': match.api_key}
+        for _ in range(2):
+            self.assertEqual(self.app.post('/match/1/map/0/finish', data=data).status_code, 200)
+
+        data = self.get_json('/api/v1/teams/1/maps')
+        self.assertEqual(len(data['data']), 1)
+        result = data['data'][0]
+        self.assertEqual(result['map_name'], 'de_dust2')
+        self.assertEqual((result['wins'], result['losses']), (1, 0))
+        self.assertEqual((result['rounds_won'], result['rounds_lost']), (16, 10))
+
+        result = self.get_json('/api/v1/teams/2/maps')['data'][0]
+        self.assertEqual((result['wins'], result['losses']), (0, 1))
+        self.assertEqual((result['rounds_won'], result['rounds_lost']), (10, 16))
+
+        data = self.get_json('/api/v1/maps')
+        self.assertEqual([(m['map_name'], m['played']) for m in data['data']], [('de_dust2', 1)])
+        self.assertIn(b'de_dust2', self.app.get('/team/1').data)
+
+
+if __name__ == '__main__':
+    unittest.main()
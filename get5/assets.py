@@ -0,0 +1,113 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import request, send_file, send_from_directory, safe_join
+
+from get5 import app, config_setting
+
+# Text assets are gzipped once on startup, images are already compressed.
+PRECOMPRESS_EXTENSIONS = ('.css', '.js', '.svg', '.ico', '.json', '.txt')
+COMPRESS_MIMETYPES = ('text/html', 'application/json')
+
+_hashes = {}
+
+
+def get_hash(filename):
+    """Returns a short hash of a static file's content, or None if it doesn't exist."""
+    # Files change without a restart while developing.
+    if filename not in _hashes or app.debug:
+        try:
+            with open(safe_join(app.static_folder, filename), 'rb') as f:
+                _hashes[filename] = hashlib.md5(f.read()).hexdigest()[:10]
+        except (IOError, OSError):
+            return None
+    return _hashes[filename]
+
+
+def static_url(filename):
+    """Url of a static file, fingerprinted with its content hash.
+
+    Fingerprinted urls change whenever the file does, so browsers can cache
+    them without ever revalidating.
+    """
+    file_hash = get_hash(filename)
+    if file_hash is None:
+        return '/static/{}'.format(filename)
+    return '/static/{}?v={}'.format(filename, file_hash)
+
+
+def fingerprint(url):
+    """Same as static_url, for a url that already starts with /static/."""
+    if url and url.startswith('/static/'):
+        return static_url(url[len('/static/'):])
+    return url
+
+
+def precompress(static_folder):
+    """Writes a .gz copy next to each text asset that is missing or outdated."""
+    for root, _, filenames in os.walk(static_folder):
+        for filename in filenames:
+            if not filename.endswith(PRECOMPRESS_EXTENSIONS):
+                continue
+            path = os.path.join(root, filename)
+            gz_path = path + '.gz'
+            if os.path.isfile(gz_path) and os.path.getmtime(gz_path) >= os.path.getmtime(path):
+                continue
+            with open(path, 'rb') as f_in:
+                data = gzip.compress(f_in.read(), 9)
+            with open(gz_path, 'wb') as f_out:
+                f_out.write(data)
+
+
+def send_static_file(filename):
+    version = request.args.get('v')
+    if version and version == get_hash(filename):
+        cache_timeout = config_setting('STATIC_MAX_AGE')
+    else:
+        cache_timeout = app.get_send_file_max_age(filename)
+
+    path = safe_join(app.static_folder, filename)
+    gz_path = path + '.gz'
+    if ('gzip' in request.accept_encodings and os.path.isfile(gz_path) and
+            os.path.isfile(path) and os.path.getmtime(gz_path) >= os.path.getmtime(path)):
+        response = send_file(gz_path, mimetype=mimetypes.guess_type(filename)[0],
+                             conditional=True, cache_timeout=cache_timeout)
+        response.headers['Content-Encoding'] = 'gzip'
+    else:
+        response = send_from_directory(app.static_folder, filename,
+                                       cache_timeout=cache_timeout)
+
+    response.cache_control.public = True
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def compress_response(response):
+    """Gzips html and json responses that are large enough to benefit from it."""
+    if (response.status_code != 200 or response.direct_passthrough or response.is_streamed or
+            response.mimetype not in COMPRESS_MIMETYPES or
+            'Content-Encoding' in response.headers or
+            'gzip' not in request.accept_encodings):
+        return response
+
+    data = response.get_data()
+    if len(data) < config_setting('COMPRESS_MIN_SIZE'):
+        return response
+
+    response.set_data(gzip.compress(data, config_setting('COMPRESS_LEVEL')))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_app(app):
+    app.jinja_env.globals.update(static_url=static_url)
+    app.view_functions['static'] = send_static_file
+    app.after_request(compress_response)
+
+    try:
+        precompress(app.static_folder)
+    except (IOError, OSError) as e:
+        app.logger.error('Failed to precompress static files: {}'.format(e))
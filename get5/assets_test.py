@@ -0,0 +1,48 @@
+import gzip
+import os
+import unittest
+
+import get5
+from . import assets
+from . import get5_test
+
+
+class AssetsTests(get5_test.Get5Test):
+
+    def test_static_url(self):
+        url = assets.static_url('css/custom.css')
+        self.assertTrue(url.startswith('/static/css/custom.css?v='))
+        self.assertEqual(assets.fingerprint('/static/css/custom.css'), url)
+        self.assertEqual(assets.static_url('css/missing.css'), '/static/css/missing.css')
+
+    def test_static_caching(self):
+        response = self.app.get(assets.static_url('css/custom.css'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.cache_control.max_age, 60 * 60 * 24 * 365)
+
+        # An outdated fingerprint only gets the default max age.
+        response = self.app.get('/static/css/custom.css?v=outdated')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.cache_control.max_age, 60 * 60 * 24 * 365)
+
+    def test_precompressed_static(self):
+        response = self.app.get('/static/css/custom.css', headers={'Accept-Encoding': 'gzip'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertEqual(response.mimetype, 'text/css')
+        with open(os.path.join(get5.app.static_folder, 'css', 'custom.css'), 'rb') as f:
+            self.assertEqual(gzip.decompress(response.data), f.read())
+
+    def test_compressed_pages(self):
+        plain = self.app.get('/matches')
+        self.assertNotIn('Content-Encoding', plain.headers)
+
+        response = self.app.get('/matches', headers={'Accept-Encoding': 'gzip, deflate'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response.headers['Vary'])
+        self.assertEqual(gzip.decompress(response.data), plain.data)
+
+
+if __name__ == '__main__':
+    unittest.main()
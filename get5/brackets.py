@@ -0,0 +1,94 @@
+from get5 import cache
+from . import fragments
+from .models import Team, GameServer, MapStats
+
+# Snapshots are also invalidated explicitly, this only bounds stale entries.
+SNAPSHOT_TIMEOUT = 60 * 60
+
+
+def invalidate(tournament_id):
+    """Marks the cached bracket of a tournament as outdated.
+
+    Must be called whenever a match, participant or score shown on the
+    tournament page changes.
+    """
+    fragments.invalidate('tournament', tournament_id)
+
+
+def get_snapshot(tournament):
+    key = 'tournament_bracket/{}/{}'.format(
+        tournament.id, fragments.get_version('tournament', tournament.id))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(tournament)
+        cache.set(key, snapshot, timeout=SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def _team_dict(teams, team_id):
+    team = teams.get(team_id)
+    if team is None:
+        return {'id': team_id, 'name': ''}
+    return {'id': team.id, 'name': team.name}
+
+
+def build_snapshot(tournament):
+    """Builds everything the tournament page shows about its matches.
+
+    Matches, their teams, servers and bo1 map scores are each loaded with a
+    single query, instead of several queries per match.
+    """
+    matches = tournament.matches.all()
+    participants = tournament.participants.all()
+
+    teams = {t.id: t for t in participants}
+    team_ids = {m.team1_id for m in matches} | {m.team2_id for m in matches}
+    team_ids.difference_update(teams)
+    team_ids.discard(None)
+    if team_ids:
+        teams.update((t.id, t) for t in Team.query.filter(Team.id.in_(team_ids)))
+
+    server_ids = {m.server_id for m in matches if m.server_id is not None}
+    servers = {}
+    if server_ids:
+        servers = {s.id: s for s in GameServer.query.filter(GameServer.id.in_(server_ids))}
+
+    # A bo1 shows the score of its only map instead of the series score.
+    bo1_ids = [m.id for m in matches if m.max_maps == 1]
+    map_scores = {}
+    if bo1_ids:
+        query = MapStats.query.filter(MapStats.match_id.in_(bo1_ids)).order_by(MapStats.id)
+        for map_stats in query:
+            if map_stats.match_id not in map_scores:
+                map_scores[map_stats.match_id] = map_stats.get_live_score()
+
+    snapshot = {
+        'participants': [_team_dict(teams, t.id) for t in participants],
+        'pending': [],
+        'live': [],
+        'finished': [],
+    }
+    for match in matches:
+        if match.max_maps == 1:
+            score = map_scores.get(match.id, (0, 0))
+        else:
+            score = (match.team1_score, match.team2_score)
+
+        server = servers.get(match.server_id)
+        entry = {
+            'id': match.id,
+            'title': match.title,
+            'team1': _team_dict(teams, match.team1_id),
+            'team2': _team_dict(teams, match.team2_id),
+            'score': score,
+            'server': server.get_display() if server else None,
+        }
+
+        if match.pending():
+            snapshot['pending'].append(entry)
+        elif match.live():
+            snapshot['live'].append(entry)
+        elif match.finished():
+            snapshot['finished'].append(entry)
+
+    return snapshot
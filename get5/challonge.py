@@ -1,15 +1,35 @@
-from requests import request, HTTPError
+from requests import HTTPError
 import itertools
 from threading import Thread
 import queue
 
-from get5 import config_setting
+from get5 import cache, config_setting
+from . import http_client
 
 BASE_URL="https://api.challonge.com/v1/"
 
+# Fields of a challonge tournament that are kept in Tournament.challonge_data.
+SUMMARY_FIELDS = ('id', 'name', 'url', 'full_challonge_url', 'state', 'progress_meter',
+                  'tournament_type', 'sign_up_url', 'updated_at')
+
 class ChallongeException(Exception):
     pass
 
+
+def compact_tournament_data(reply):
+    """Reduces a challonge tournament reply to what get5-web keeps.
+
+    Participants and matches are only stored as id -> updated_at maps, which
+    is enough to tell which of them changed on the next sync.
+    """
+    data = {key: reply.get(key) for key in SUMMARY_FIELDS}
+    data['participants'] = {p['participant']['id']: p['participant'].get('updated_at')
+                            for p in reply.get('participants') or []}
+    data['matches'] = {m['match']['id']: m['match'].get('updated_at')
+                       for m in reply.get('matches') or []}
+    return data
+
+
 class ChallongeClient(object):
 
     def fetch(self, method, uri, params_prefix=None, **params):
@@ -22,7 +42,7 @@ class ChallongeClient(object):
         else:
             r_data = {"data": params, "params": {'api_key': config_setting('CHALLONGE_API_KEY')}}
         try:
-            response = request(
+            response = http_client.request(
                 method,
                 url,
                 **r_data)
@@ -94,6 +114,19 @@ class ChallongeClient(object):
                           include_matches=include_matches,
                           include_participants=include_participants)
 
+    def cached_tournament(self, id):
+        """Like tournament(), but reuses a reply fetched less than
+        CHALLONGE_MIN_REFRESH_INTERVAL seconds ago."""
+        key = 'challonge_tournament/{}'.format(id)
+        reply = cache.get(key)
+        if reply is None:
+            reply = self.tournament(id, include_participants=True, include_matches=True)
+            cache.set(key, reply, timeout=config_setting('CHALLONGE_MIN_REFRESH_INTERVAL'))
+        return reply
+
+    def forget_tournament(self, id):
+        cache.delete('challonge_tournament/{}'.format(id))
+
     def create_tournament(self, name, url, private=True, open_signup=True, **kwargs):
         return self.fetch('post', 'tournaments',
                           params_prefix='tournament',
@@ -105,10 +138,12 @@ class ChallongeClient(object):
         return val
 
     def start_tournament(self, id):
+        self.forget_tournament(id)
         val = self.fetch('post', 'tournaments/{}/start'.format(id), include_matches=1)
         return val
 
     def reset_tournament(self, id):
+        self.forget_tournament(id)
         val = self.fetch('post', 'tournaments/{}/reset'.format(id))
         return val
 
@@ -119,6 +154,7 @@ class ChallongeClient(object):
         return self.fetch('get', 'tournaments/{}/participants'.format(tournament_id))
 
     def update_participant_misc(self, tournament_id, id, misc):
+        self.forget_tournament(tournament_id)
         return self.fetch('put', 'tournaments/{}/participants/{}'.format(tournament_id, id),
                           params_prefix='participant', misc=str(misc))
 
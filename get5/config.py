@@ -20,6 +20,26 @@ defaults = {
     'CREATE_TOURNAMENT_NAME_TEXT': False,
     'WHITELISTED_IDS': [],
     'ADMIN_IDS': [],
+    'API_CACHE_MAX_AGE': 5,
+    'API_CACHE_MAX_AGE_FINALIZED': 3600,
+    'LIVE_SCORE_FLUSH_INTERVAL': 15,
+    'CHALLONGE_MIN_REFRESH_INTERVAL': 30,
+    'STEAM_RESOLVE_TIMEOUT': 10.0,
+    'STEAM_PROFILE_REFRESH_INTERVAL': 60 * 60 * 6,
+    'USER_SESSION_REFRESH': 60 * 5,
+    'STATIC_MAX_AGE': 60 * 60 * 24 * 365,
+    'COMPRESS_MIN_SIZE': 500,
+    'COMPRESS_LEVEL': 6,
+    'FRAGMENT_CACHE_TIMEOUT': 60,
+    'RATELIMIT_STORAGE_URL': 'memory://',
+    'RATELIMIT_STRATEGY': 'fixed-window-elastic-expiry',
+    'MATCH_KEY_SECRET': None,
+    'MATCH_KEY_LIFETIME': 60 * 60 * 24 * 7,
+    'PROFILE_SAMPLE_RATE': 0.0,
+    'PROFILE_ROUTES': [],
+    'PROFILE_HEADER_KEY': None,
+    'PROFILE_DIR': None,
+    'PROFILE_MAX_FILES': 200,
     'MAPLIST': [
         'de_cache',
         'de_cbble',
@@ -1,12 +1,21 @@
 from get5 import config_setting
 
-def get_flag_img_path(country_code):
+
+def get_flag_name(country_code):
     if not country_code:
         country_code = config_setting('DEFAULT_COUNTRY_CODE')
     if valid_country(country_code):
-        return '/static/img/valve_flags/{}.png'.format(country_code.lower())
+        return country_code.lower()
     else:
+        return '_unknown'
+
+
+def get_flag_img_path(country_code):
+    name = get_flag_name(country_code)
+    if name == '_unknown':
         return '/static/img/_unknown.png'
+    else:
+        return '/static/img/valve_flags/{}.png'.format(name)
 
 
 def valid_country(country_code):
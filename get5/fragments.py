@@ -0,0 +1,37 @@
+import uuid
+
+from get5 import cache
+
+# Cached template fragments include the version of every object they show,
+# so changing a version makes all fragments showing that object stale.
+#
+# Versions are random tokens rather than counters: the cache may evict a
+# version at any time, and a counter falling back to its initial value would
+# bring back fragments cached under it. A fresh token can't collide with an
+# old one, and setting it needs no read, so concurrent bumps can't race.
+
+
+def _version_key(kind, object_id):
+    return 'fragment_version/{}/{}'.format(kind, object_id)
+
+
+def _new_version(key):
+    version = uuid.uuid4().hex
+    cache.set(key, version, timeout=0)
+    return version
+
+
+def get_version(kind, object_id):
+    """Returns the version as a string, for use in {% cache %} keys."""
+    key = _version_key(kind, object_id)
+    return cache.get(key) or _new_version(key)
+
+
+def invalidate(kind, object_id):
+    if object_id is None:
+        return
+    _new_version(_version_key(kind, object_id))
+
+
+def init_app(app):
+    app.jinja_env.globals.update(fragment_version=get_version)
@@ -0,0 +1,56 @@
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+from . import instrumentation
+
+# All outbound http calls (steam, challonge) go through one shared session,
+# so connections (and TLS sessions) to each host are kept alive and reused.
+CONNECT_TIMEOUT = 3.05
+READ_TIMEOUT = 10
+POOL_CONNECTIONS = 10  # Number of hosts to keep pools for
+POOL_MAXSIZE = 10  # Connections kept alive per host
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def _create_session():
+    # Only idempotent methods are retried. The last response is returned
+    # instead of raising once retries are used up.
+    retry = Retry(total=3, backoff_factor=0.3, status_forcelist=(500, 502, 503, 504),
+                  raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE,
+                          max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def get_session():
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = _create_session()
+    return _session
+
+
+def request(method, url, **kwargs):
+    """Same as requests.request, but pooled, with a default timeout and
+    with the latency recorded per host."""
+    kwargs.setdefault('timeout', (CONNECT_TIMEOUT, READ_TIMEOUT))
+    start = time.time()
+    try:
+        return get_session().request(method, url, **kwargs)
+    finally:
+        instrumentation.record_timing(
+            'HTTP {}'.format(urlsplit(url).hostname), time.time() - start)
+
+
+def get(url, **kwargs):
+    return request('get', url, **kwargs)
@@ -0,0 +1,31 @@
+import collections
+import threading
+
+# Simple per-process counters, shown on the metrics page. These reset when
+# the worker restarts and are not shared between gunicorn workers.
+_lock = threading.Lock()
+_counters = collections.Counter()
+_timings = {}
+
+
+def increment(name, value=1):
+    with _lock:
+        _counters[name] += value
+
+
+def get_counters():
+    with _lock:
+        return sorted(_counters.items())
+
+
+def record_timing(name, seconds):
+    with _lock:
+        count, total, maximum = _timings.get(name, (0, 0.0, 0.0))
+        _timings[name] = (count + 1, total + seconds, max(maximum, seconds))
+
+
+def get_timings():
+    """Returns (name, count, average ms, max ms) for every recorded timing."""
+    with _lock:
+        return [(name, count, 1000.0 * total / count, 1000.0 * maximum)
+                for name, (count, total, maximum) in sorted(_timings.items())]
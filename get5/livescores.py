@@ -0,0 +1,110 @@
+import datetime
+import time
+
+from get5 import cache, config_setting
+
+# Between flushes the latest live score only exists in this buffer. It relies
+# on the cache being shared by every web server and not evicting entries: a
+# filesystem cache only works for a single host, and entries it prunes when
+# full lose up to LIVE_SCORE_FLUSH_INTERVAL seconds of score unless the map
+# finish callback carries the final score.
+
+# Pending entries outlive any realistic map, they are dropped on flush.
+ENTRY_TIMEOUT = 60 * 60 * 12
+
+
+def _key(map_stats):
+    # The map start time is part of the key so that a recreated database
+    # never picks up stale scores for a reused map id.
+    start = map_stats.start_time.isoformat() if map_stats.start_time else ''
+    return 'live_score/{}/{}'.format(map_stats.id, start)
+
+
+def _write_rounds(map_stats, entry):
+    from .models import RoundSnapshot
+    rounds = entry.get('rounds')
+    entry['rounds'] = []
+    return RoundSnapshot.add_rounds(map_stats, rounds or [])
+
+
+def update(map_stats, team1_score, team2_score):
+    """Records the latest live score of a map.
+
+    The score, and a timeline row for every new round, are held in the
+    cache, so every worker sharing it serves them to viewers immediately, but
+    they are only written to the database once per LIVE_SCORE_FLUSH_INTERVAL
+    seconds. Returns True if the caller should commit because rows were
+    written.
+    """
+    key = _key(map_stats)
+    entry = cache.get(key) or {'flushed_at': 0, 'last_round': 0, 'rounds': []}
+    entry['scores'] = (team1_score, team2_score)
+
+    now = time.time()
+    round_number = team1_score + team2_score
+    if round_number > entry['last_round']:
+        seconds = 0
+        if map_stats.start_time:
+            seconds = int((datetime.datetime.utcnow() - map_stats.start_time).total_seconds())
+        entry['rounds'].append({'round_number': round_number, 'team1_score': team1_score,
+                                'team2_score': team2_score, 'seconds': max(seconds, 0)})
+        entry['last_round'] = round_number
+
+    if now - entry['flushed_at'] >= config_setting('LIVE_SCORE_FLUSH_INTERVAL'):
+        map_stats.team1_score = team1_score
+        map_stats.team2_score = team2_score
+        _write_rounds(map_stats, entry)
+        entry['flushed_at'] = now
+        entry['pending'] = False
+    else:
+        entry['pending'] = True
+
+    cache.set(key, entry, timeout=ENTRY_TIMEOUT)
+    return not entry['pending']
+
+
+def flush(map_stats):
+    """Writes a buffered score and rounds to the database and drops them from the buffer.
+
+    Returns True if rows changed and need to be committed.
+    """
+    key = _key(map_stats)
+    entry = cache.get(key)
+    cache.delete(key)
+    if not entry:
+        return False
+
+    changed = _write_rounds(map_stats, entry)
+    if entry.get('pending'):
+        map_stats.team1_score, map_stats.team2_score = entry['scores']
+        changed = True
+    return changed
+
+
+def flush_match(match):
+    """Flushes the buffered scores of every map of a match that ended.
+
+    Returns True if any row changed and needs to be committed.
+    """
+    changed = False
+    for map_stats in match.map_stats:
+        changed = flush(map_stats) or changed
+    return changed
+
+
+def get_score(map_stats):
+    """Returns the most recent (team1_score, team2_score) of a map."""
+    if map_stats.end_time is None:
+        entry = cache.get(_key(map_stats))
+        if entry:
+            return tuple(entry['scores'])
+    return (map_stats.team1_score, map_stats.team2_score)
+
+
+def get_pending_rounds(map_stats):
+    """Returns the timeline rows of a live map that aren't written yet."""
+    if map_stats.end_time is None:
+        entry = cache.get(_key(map_stats))
+        if entry:
+            return list(entry.get('rounds') or [])
+    return []
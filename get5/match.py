@@ -4,14 +4,16 @@ from flask import Blueprint, request, render_template, flash, g, redirect, jsoni
 from . import steamid
 import get5
 from get5 import app, db, BadRequestError, config_setting
-from .models import User, Team, Tournament, Match, GameServer
+from .models import User, Team, Tournament, Match, GameServer, MetricCounter
+from . import brackets
+from . import fragments
+from . import livescores
 from . import util
 
 from wtforms import (
     Form, widgets, validators,
-    StringField, RadioField,
+    StringField, RadioField, IntegerField,
     SelectField, ValidationError, SelectMultipleField)
-from wtforms.ext.sqlalchemy.fields import QuerySelectField
 
 match_blueprint = Blueprint('match', __name__)
 
@@ -21,11 +23,41 @@ class MultiCheckboxField(SelectMultipleField):
     option_widget = widgets.CheckboxInput()
 
 
+class ModelIdField(IntegerField):
+    """The id of a single object picked through a search box.
+
+    Only the submitted id is looked up (in query_factory, so users can only
+    pick what they may use), instead of loading every choice like a
+    QuerySelectField does.
+    """
+    widget = widgets.HiddenInput()
+
+    def __init__(self, label=None, validators=None, query_factory=None, **kwargs):
+        super(ModelIdField, self).__init__(label, validators, **kwargs)
+        self.query_factory = query_factory
+        self._object = None
+
+    def get_object(self):
+        if self.data and (self._object is None or self._object.id != self.data):
+            self._object = self.query_factory().filter_by(id=self.data).first()
+        return self._object if self.data else None
+
+    def pre_validate(self, form):
+        if self.data and self.get_object() is None:
+            raise ValidationError('Not a valid choice')
+
+
 def different_teams_validator(form, field):
-    if form.team1.data == form.team2.data:
+    if form.team1_id.data == form.team2_id.data:
         raise ValidationError('Teams cannot be equal')
 
 
+def server_available_validator(form, field):
+    server = field.get_object()
+    if server is not None and server.in_use and server.id != form.current_server_id:
+        raise ValidationError('Server is already in use')
+
+
 def mappool_validator(form, field):
     if 'preset' in form.series_type.data and len(form.veto_mappool.data) != 1:
         raise ValidationError(
@@ -45,11 +77,16 @@ def server_query_factory():
     return GameServer.query.filter((GameServer.public_server == True) | (GameServer.user_id == g.user.id))
 
 def team_query_factory():
-    return Team.query.filter((Team.public_team == True) | (Team.user_id == g.user.id))
+    return Team.query.filter(
+        (Team.public_team == True) | (Team.user_id == g.user.id))  # noqa: E712
 
 class MatchForm(Form):
-    server = QuerySelectField('Server', validators=[validators.required()],
-                              query_factory=server_query_factory)
+    # The server of the match being edited, which is allowed to be in use.
+    current_server_id = None
+
+    server_id = ModelIdField('Server',
+                             validators=[validators.required(), server_available_validator],
+                             query_factory=server_query_factory)
 
     match_title = StringField('Match title text',
                               default='Map {MAPNUMBER} of {MAXMAPS}',
@@ -67,16 +104,16 @@ class MatchForm(Form):
                                  ('bo7', 'Bo7 with map vetoes'),
                              ])
 
-    team1 = QuerySelectField('Team 1', get_label='name', validators=[validators.required()],
-                             query_factory=team_query_factory)
+    team1_id = ModelIdField('Team 1', validators=[validators.required()],
+                            query_factory=team_query_factory)
 
     team1_string = StringField('Team 1 title text',
                                default='',
                                validators=[validators.Length(min=-1,
                                                              max=Match.team1_string.type.length)])
 
-    team2 = QuerySelectField('Team 2', get_label='name', query_factory=team_query_factory,
-                             validators=[validators.required(), different_teams_validator])
+    team2_id = ModelIdField('Team 2', query_factory=team_query_factory,
+                            validators=[validators.required(), different_teams_validator])
 
     team2_string = StringField('Team 2 title text',
                                default='',
@@ -111,7 +148,7 @@ def match_create():
         if form.validate():
             mock = config_setting('TESTING')
             
-            server = form.server.data
+            server = form.server_id.get_object()
 
             match_on_server = g.user.matches.filter_by(
                 server_id=server.id, end_time=None, cancelled=False).first()
@@ -142,7 +179,7 @@ def match_create():
                     max_maps = 1
 
                 match = Match.create(
-                    g.user, form.team1.data.id, form.team2.data.id,
+                    g.user, form.team1_id.data, form.team2_id.data,
                     form.data['team1_string'], form.data['team2_string'],
                     max_maps, skip_veto, form.data['match_title'],
                     form.data['veto_mappool'], server_id=server.id)
@@ -156,6 +193,7 @@ def match_create():
                 server.in_use = True
 
                 db.session.commit()
+                fragments.invalidate('user', g.user.id)
                 app.logger.info('User {} created match {}, assigned to server {}'
                                 .format(g.user.id, match.id, server.id))
 
@@ -217,10 +255,11 @@ def match_edit(matchid):
 
     form = MatchForm(
         request.form,
-        server=GameServer.query.get(match.server_id) if match.server_id else None,
+        server_id=match.server_id,
         series_type="bo{}".format(match.max_maps),
-        team1=Team.query.get(match.team1_id),
-        team2=Team.query.get(match.team2_id),)
+        team1_id=match.team1_id,
+        team2_id=match.team2_id,)
+    form.current_server_id = match.server_id
 
     if request.method == 'GET':
         return render_template('match_create.html', user=g.user, form=form,
@@ -228,7 +267,9 @@ def match_edit(matchid):
 
     elif request.method == 'POST':
         if request.method == 'POST':
-            if form.validate() or True: # TODO form validation on edit
+            # Only the teams, server and series type can be edited.
+            edited_fields = (form.server_id, form.team1_id, form.team2_id, form.series_type)
+            if all(field.validate(form) for field in edited_fields):
                 skip_veto = 'preset' in form.data['series_type']
                 try:
                     max_maps = int(form.data['series_type'][2])
@@ -236,13 +277,14 @@ def match_edit(matchid):
                     max_maps = 1
                 data = form.data
                 update_dict = {
-                    'team1_id': form.team1.data.id,
-                    'team2_id': form.team2.data.id,
+                    'team1_id': form.team1_id.data,
+                    'team2_id': form.team2_id.data,
                     'max_maps': max_maps,
-                    'server_id': form.server.data.id,
+                    'server_id': form.server_id.data,
                 }
                 Match.query.filter_by(id=matchid).update(update_dict)
                 db.session.commit()
+                brackets.invalidate(match.tournament_id)
                 return redirect(url_for('match.match', matchid=matchid))
             else:
                 get5.flash_errors(form)
@@ -285,6 +327,7 @@ def match_start(matchid):
         match.start_time = datetime.datetime.utcnow()
         if match.send_to_server():
             db.session.commit()
+            brackets.invalidate(match.tournament_id)
             return redirect('/mymatches')
 
     flash("Failed to start match... " + message, 'warning')
@@ -296,13 +339,16 @@ def match_cancel(matchid):
     admintools_check(g.user, match)
 
     match.cancelled = True
+    livescores.flush_match(match)
     server = None
     if match.server_id:
         server = GameServer.query.get(match.server_id)
         if server:
             server.in_use = False
-   
+
     db.session.commit()
+    brackets.invalidate(match.tournament_id)
+    fragments.invalidate('user', match.user_id)
 
     try:
         server.send_rcon_command('get5_endmatch', raise_errors=True)
@@ -318,8 +364,13 @@ def match_delete(matchid):
     admintools_check(g.user, match, can_be_cancelled=True)
     
     if match.cancelled:
-        Match.query.filter_by(id=matchid).delete()
+        tournament_id = match.tournament_id
+        user_id = match.user_id
+        deleted = Match.query.filter_by(id=matchid).delete()
+        MetricCounter.increment('matches', -deleted)
         db.session.commit()
+        brackets.invalidate(tournament_id)
+        fragments.invalidate('user', user_id)
     else:
         flash('You cannot delete matches that are not canceled!', 'danger')
 
@@ -0,0 +1,65 @@
+import base64
+import hashlib
+import hmac
+import time
+
+from flask import g, request
+
+from get5 import config_setting
+
+# Keys given to the plugin are signed tokens of the form
+# "<match id>.<max maps>.<expiry>.<signature>", so callbacks can be
+# authenticated and rate limited without loading the match. Matches created
+# before these existed keep their random Match.api_key, which is still
+# accepted.
+_SALT = b'get5-match-key'
+
+
+def _signature(payload):
+    secret = config_setting('MATCH_KEY_SECRET') or config_setting('SECRET_KEY')
+    digest = hmac.new(secret.encode('utf8'), _SALT + b':' + payload.encode('utf8'),
+                      hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest[:16]).decode('ascii').rstrip('=')
+
+
+def issue(match):
+    """Returns a new signed api key for the match."""
+    expires = int(time.time()) + config_setting('MATCH_KEY_LIFETIME')
+    payload = '{}.{}.{}'.format(match.id, match.max_maps or 1, expires)
+    return '{}.{}'.format(payload, _signature(payload))
+
+
+def is_signed(key):
+    return key is not None and key.count('.') == 3
+
+
+def verify(key):
+    """Returns (match id, max maps) of a valid, unexpired signed key, or None."""
+    if not is_signed(key):
+        return None
+
+    payload, signature = key.rsplit('.', 1)
+    if not hmac.compare_digest(signature.encode('utf8'), _signature(payload).encode('utf8')):
+        return None
+    try:
+        matchid, max_maps, expires = [int(x) for x in payload.split('.')]
+    except ValueError:
+        return None
+    if expires < time.time():
+        return None
+    return matchid, max_maps
+
+
+def get_request_claims():
+    """verify() of the current request's key, only computed once per request."""
+    if not hasattr(g, 'match_key_claims'):
+        g.match_key_claims = verify(request.values.get('key'))
+    return g.match_key_claims
+
+
+def check(match, key):
+    """Whether key is a valid api key for the match, signed or not."""
+    if is_signed(key):
+        claims = verify(key)
+        return claims is not None and claims[0] == match.id
+    return key is not None and key == match.api_key
@@ -18,6 +18,32 @@ class MatchTests(get5_test.Get5Test):
         self.assertEqual(self.app.get('/matches').status_code, 200)
         self.assertEqual(self.app.get('/matches/1').status_code, 200)
 
+    # The logged in user is kept in the session after the first request
+    def test_session_user(self):
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 1
+            self.assertEqual(c.get('/matches').status_code, 200)
+            with c.session_transaction() as sess:
+                self.assertEqual(sess['user']['id'], 1)
+                self.assertEqual(sess['user']['steam_id'], '123')
+                self.assertTrue(sess['user']['admin'])
+
+            # Served from the session, still able to use relationships
+            self.assertEqual(c.get('/match/create').status_code, 200)
+
+            # Switching users loads the new user
+            with c.session_transaction() as sess:
+                sess['user_id'] = 2
+            self.assertEqual(c.get('/matches').status_code, 200)
+            with c.session_transaction() as sess:
+                self.assertEqual(sess['user']['id'], 2)
+                self.assertFalse(sess['user']['admin'])
+
+            c.get('/logout')
+            with c.session_transaction() as sess:
+                self.assertNotIn('user', sess)
+
     # Test trying to create a match on a server already in use
     def test_match_create_already_live(self):
         with self.app as c:
@@ -65,6 +91,24 @@ class MatchTests(get5_test.Get5Test):
             self.assertEqual(response.status_code, 200)
             self.assertIn('Error in the Server field', response.get_data().decode('utf8'))
 
+    # Teams can only be picked by id if the user may use them
+    def test_match_create_other_users_team(self):
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 2
+
+            response = c.post('/match/create',
+                              follow_redirects=False,
+                              data={
+                                  'server_id': 2,
+                                  'team1_id': 1,
+                                  'team2_id': 2,
+                                  'series_type': 'bo1',
+                                  'veto_mappool': ['de_dust2', 'de_cache', 'de_mirage'],
+                              })
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Error in the Team 1 field', response.get_data().decode('utf8'))
+
     # Test successful match creation
     def test_match_create(self):
         with self.app as c:
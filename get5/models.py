@@ -1,10 +1,14 @@
-from get5 import app, db, cache
+from get5 import app, cache, db
+from . import assets
 from . import countries
+from . import livescores
 from . import logos
+from . import match_keys
+from . import sprites
 from . import util
 
 from flask import url_for, Markup
-import requests
+from sqlalchemy.orm import make_transient_to_detached
 
 import datetime
 import string
@@ -28,11 +32,28 @@ class User(db.Model):
             rv = User()
             rv.steam_id = steam_id
             db.session.add(rv)
+            MetricCounter.increment('users')
             app.logger.info('Creating user for {}'.format(steam_id))
             rv.admin = ('ADMIN_IDS' in app.config) and (
                 steam_id in app.config['ADMIN_IDS'])
         return rv
 
+    @staticmethod
+    def from_identity(identity):
+        """Rebuilds a user from the columns saved by get_identity, without a query."""
+        rv = User(id=identity['id'], steam_id=identity['steam_id'],
+                  name=identity['name'], admin=identity['admin'])
+        make_transient_to_detached(rv)
+        return db.session.merge(rv, load=False)
+
+    def get_identity(self):
+        return {
+            'id': self.id,
+            'steam_id': self.steam_id,
+            'name': self.name,
+            'admin': bool(self.admin),
+        }
+
     def get_url(self):
         return url_for('user', userid=self.id)
 
@@ -50,8 +71,8 @@ class User(db.Model):
 class GameServer(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    display_name = db.Column(db.String(32), default='')
-    ip_string = db.Column(db.String(32))
+    display_name = db.Column(db.String(32), default='', index=True)
+    ip_string = db.Column(db.String(32), index=True)
     port = db.Column(db.Integer)
     rcon_password = db.Column(db.String(32))
     in_use = db.Column(db.Boolean, default=False)
@@ -67,6 +88,7 @@ class GameServer(db.Model):
         rv.rcon_password = rcon_password
         rv.public_server = public_server
         db.session.add(rv)
+        MetricCounter.increment('servers')
         return rv
 
     def send_rcon_command(self, command, raise_errors=False, num_retries=3, timeout=3.0):
@@ -91,7 +113,7 @@ class Team(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'))
-    name = db.Column(db.String(40))
+    name = db.Column(db.String(40), index=True)
     tag = db.Column(db.String(40), default='')
     flag = db.Column(db.String(4), default='')
     logo = db.Column(db.String(10), default='')
@@ -106,6 +128,7 @@ class Team(db.Model):
         rv.user_id = user.id
         rv.set_data(name, tag, flag, logo, auths, challonge_id, public_team and user.admin, open_join)
         db.session.add(rv)
+        MetricCounter.increment('teams')
         return rv
 
     def set_data(self, name, tag, flag, logo, auths, challonge_id, public_team, open_join):
@@ -128,15 +151,9 @@ class Team(db.Model):
         return False
 
     def get_players(self):
-        results = []
-        for steam64 in self.auths:
-            if steam64:
-                name = get_steam_name(steam64)
-                if not name:
-                    name = ''
-
-                results.append((steam64, name))
-        return results
+        steam_ids = [steam64 for steam64 in self.auths if steam64]
+        names = SteamProfile.get_names(steam_ids)
+        return [(steam64, names.get(steam64, '')) for steam64 in steam_ids]
 
     def can_delete(self, user):
         if not self.can_edit(user):
@@ -179,12 +196,13 @@ class Team(db.Model):
         if match.max_maps == 1:
             mapstat = match.map_stats.first()
             if mapstat:
+                team1_score, team2_score = mapstat.get_live_score()
                 if match.team1_id == self.id:
-                    my_score = mapstat.team1_score
-                    other_team_score = mapstat.team2_score
+                    my_score = team1_score
+                    other_team_score = team2_score
                 else:
-                    my_score = mapstat.team2_score
-                    other_team_score = mapstat.team1_score
+                    my_score = team2_score
+                    other_team_score = team1_score
 
         if match.live():
             return 'Live, {}:{} vs {}'.format(my_score, other_team_score, other_team.name)
@@ -200,17 +218,27 @@ class Team(db.Model):
         width = int(round(32.0 * scale))
         height = int(round(21.0 * scale))
 
+        sprite = sprites.get_sprite_html(
+            'flag', countries.get_flag_name(self.flag), width, height)
+        if sprite:
+            return sprite
+
         html = '<img src="{}"  width="{}" height="{}">'
         output = html.format(
-            countries.get_flag_img_path(self.flag), width, height)
+            assets.fingerprint(countries.get_flag_img_path(self.flag)), width, height)
         return Markup(output)
 
     def get_logo_html(self, scale=1.0):
         if logos.has_logo(self.logo):
             width = int(round(32.0 * scale))
             height = int(round(32.0 * scale))
+            sprite = sprites.get_sprite_html('logo', self.logo, width, height)
+            if sprite:
+                return sprite
+
             html = ('<img src="{}"  width="{}" height="{}">')
-            return Markup(html.format(logos.get_logo_img(self.logo), width, height))
+            src = assets.fingerprint(logos.get_logo_img(self.logo))
+            return Markup(html.format(src, width, height))
         else:
             return ''
 
@@ -254,6 +282,8 @@ class Match(db.Model):
     api_key = db.Column(db.String(32))
 
     veto_mappool = db.Column(db.String(160))
+    # Vetoes as they happened, e.g. "1b:de_nuke 2b:de_train 1p:de_dust2"
+    veto_log = db.Column(db.String(400))  # Fits every map of a full veto_mappool
     map_stats = db.relationship('MapStats', backref='match', lazy='dynamic')
 
     team1_score = db.Column(db.Integer, default=0)
@@ -269,6 +299,7 @@ class Match(db.Model):
         rv.api_key = ''.join(random.SystemRandom().choice(
             string.ascii_uppercase + string.digits) for _ in range(24))
         db.session.add(rv)
+        MetricCounter.increment('matches')
         return rv
 
     def set_data(self, team1_id, team2_id, team1_string, team2_string,
@@ -337,7 +368,7 @@ class Match(db.Model):
             if not mapstat:
                 return (0, 0)
             else:
-                return (mapstat.team1_score, mapstat.team2_score)
+                return mapstat.get_live_score()
 
         else:
             return (self.team1_score, self.team2_score)
@@ -345,7 +376,7 @@ class Match(db.Model):
     def get_scores(self):
         scores = list()
         for mapstat in self.map_stats.all():
-            scores.append((mapstat.team1_score, mapstat.team2_score))
+            scores.append(mapstat.get_live_score())
         return scores
 
     def get_format(self):
@@ -373,7 +404,7 @@ class Match(db.Model):
             'get5_loadmatch_url ' + url)
 
         server.send_rcon_command(
-            'get5_web_api_key ' + self.api_key)
+            'get5_web_api_key ' + match_keys.issue(self))
 
         if loadmatch_response:  # There should be no response
             return False
@@ -453,6 +484,34 @@ class Match(db.Model):
 
         return d
 
+    def add_veto(self, team, action, map_name):
+        """Appends a pick or ban to the veto log.
+
+        team is 'team1' or 'team2' and action is 'pick' or 'ban'. Returns
+        False if the map was already picked or banned, e.g. for a retried
+        request. Raises ValueError if the log has no room left.
+        """
+        log = self.veto_log.split() if self.veto_log else []
+        if any(entry.split(':', 1)[1] == map_name for entry in log):
+            return False
+        log.append('{}{}:{}'.format(team[-1], action[0], map_name))
+        veto_log = ' '.join(log)
+        if len(veto_log) > Match.veto_log.type.length:
+            raise ValueError('Veto log is full')
+        self.veto_log = veto_log
+        return True
+
+    def get_vetoes(self):
+        vetoes = []
+        for entry in (self.veto_log or '').split():
+            code, map_name = entry.split(':', 1)
+            vetoes.append({
+                'team': 'team' + code[0],
+                'action': 'pick' if code[1] == 'p' else 'ban',
+                'map': map_name,
+            })
+        return vetoes
+
     def __repr__(self):
         return 'Match(id={})'.format(self.id)
 
@@ -495,6 +554,7 @@ class Tournament(db.Model):
         rv.challonge_id = challonge_id
         rv.challonge_data = challonge_data
         db.session.add(rv)
+        MetricCounter.increment('tournaments')
         return rv
 
     def finalized(self):
@@ -552,8 +612,29 @@ class MapStats(db.Model):
             rv.team1_score = 0
             rv.team2_score = 0
             db.session.add(rv)
+            MetricCounter.increment('maps')
         return rv
 
+    def get_live_score(self):
+        return livescores.get_score(self)
+
+    def add_to_rollups(self):
+        """Counts this just finished map in the per-team and map pool totals."""
+        if not self.map_name:
+            return
+        MapPoolStats.add_played(self.map_name, self.end_time)
+
+        match = self.match
+        team1_score = self.team1_score or 0
+        team2_score = self.team2_score or 0
+        sides = [(match.team1_id, match.team2_id, team1_score, team2_score),
+                 (match.team2_id, match.team1_id, team2_score, team1_score)]
+        for team_id, opponent_id, rounds_won, rounds_lost in sides:
+            if team_id is not None and team_id != opponent_id:
+                TeamMapStats.add_result(team_id, self.map_name,
+                                        self.winner == team_id, self.winner == opponent_id,
+                                        rounds_won, rounds_lost, self.end_time)
+
     def __repr__(self):
         return 'MapStats(' + str(self.id) + ',' + str(self.map_name) + ')'
 
@@ -591,13 +672,29 @@ class PlayerStats(db.Model):
     firstdeath_t = db.Column(db.Integer, default=0)
     firstdeath_Ct = db.Column(db.Integer, default=0)
 
+    # Derived from the columns above by the batch job in player_ratings.py,
+    # None until it next runs over the row.
+    rating = db.Column(db.Float)
+    adr = db.Column(db.Float)
+    kpr = db.Column(db.Float)
+    hsp = db.Column(db.Float)
+    DERIVED_COLUMNS = ('rating', 'adr', 'kpr', 'hsp')
+
     def get_steam_url(self):
         return 'http://steamcommunity.com/profiles/{}'.format(self.steam_id)
 
+    def clear_derived(self):
+        for column in PlayerStats.DERIVED_COLUMNS:
+            setattr(self, column, None)
+
     def get_rating(self):
-        AverageKPR = 0.679
-        AverageSPR = 0.317
-        AverageRMK = 1.277
+        if self.rating is not None:
+            return self.rating
+
+        averages = StatAverage.get_rating_averages()
+        AverageKPR = averages['kpr']
+        AverageSPR = averages['spr']
+        AverageRMK = averages['rmk']
         KillRating = float(self.kills) / float(self.roundsplayed) / AverageKPR
         SurvivalRating = float(self.roundsplayed -
                                self.deaths) / self.roundsplayed / AverageSPR
@@ -615,19 +712,25 @@ class PlayerStats(db.Model):
             return float(self.kills) / self.deaths
 
     def get_hsp(self):
-        if self.kills == 0:
+        if self.hsp is not None:
+            return self.hsp
+        elif self.kills == 0:
             return 0.0
         else:
             return float(self.headshot_kills) / self.kills
 
     def get_adr(self):
-        if self.roundsplayed == 0:
+        if self.adr is not None:
+            return self.adr
+        elif self.roundsplayed == 0:
             return 0.0
         else:
             return float(self.damage) / self.roundsplayed
 
     def get_fpr(self):
-        if self.roundsplayed == 0:
+        if self.kpr is not None:
+            return self.kpr
+        elif self.roundsplayed == 0:
             return 0.0
         else:
             return float(self.kills) / self.roundsplayed
@@ -635,32 +738,380 @@ class PlayerStats(db.Model):
     @staticmethod
     def get_or_create(matchid, mapnumber, steam_id):
         mapstats = MapStats.get_or_create(matchid, mapnumber)
-        if len(mapstats.player_stats.all()) >= 40:  # Cap on players per map
-            return None
-
         rv = mapstats.player_stats.filter_by(steam_id=steam_id).first()
 
         if rv is None:
+            if mapstats.player_stats.count() >= 40:  # Cap on players per map
+                return None
+
             rv = PlayerStats()
             rv.match_id = matchid
             rv.map_number = mapstats.id
             rv.steam_id = steam_id
             rv.map_id = mapstats.id
             db.session.add(rv)
+            Player.get_or_create(steam_id)
+
+        return rv
+
+
+class SteamProfile(db.Model):
+    """Persona names of known steam accounts.
+
+    These are kept up to date by the background refresher in
+    steam_profiles.py, so pages never have to wait on the Steam Web API.
+    """
+    steam_id = db.Column(db.String(40), primary_key=True)
+    name = db.Column(db.String(40))
+    updated = db.Column(db.DateTime, index=True)
+
+    @staticmethod
+    def get_names(steam_ids):
+        if not steam_ids:
+            return {}
+        profiles = SteamProfile.query.filter(SteamProfile.steam_id.in_(steam_ids))
+        return {profile.steam_id: profile.name for profile in profiles}
+
+    def __repr__(self):
+        return 'SteamProfile(steam_id={}, name={})'.format(self.steam_id, self.name)
 
+
+class MetricCounter(db.Model):
+    """Row counts shown on the metrics page.
+
+    Counters are changed in the same transaction as the rows they count,
+    so the metrics page never has to run COUNT(*) over large tables.
+    """
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Integer, default=0, nullable=False)
+
+    @staticmethod
+    def increment(name, amount=1):
+        updated = MetricCounter.query.filter_by(name=name).update(
+            {MetricCounter.value: MetricCounter.value + amount}, synchronize_session=False)
+        if not updated:
+            db.session.add(MetricCounter(name=name, value=amount))
+
+    @staticmethod
+    def get_values():
+        return {counter.name: counter.value for counter in MetricCounter.query}
+
+    def __repr__(self):
+        return 'MetricCounter(name={}, value={})'.format(self.name, self.value)
+
+
+class Player(db.Model):
+    """Every steamid that has stats saved, with career totals."""
+    steam_id = db.Column(db.String(40), primary_key=True)
+    name = db.Column(db.String(40))
+    kills = db.Column(db.Integer, default=0, nullable=False, index=True)
+
+    @staticmethod
+    def get_or_create(steam_id):
+        rv = Player.query.get(steam_id)
+        if rv is None:
+            rv = Player(steam_id=steam_id, kills=0)
+            db.session.add(rv)
+            MetricCounter.increment('players')
         return rv
 
+    @staticmethod
+    def add_stats(steam_id, name=None, kills=0):
+        """Updates the totals without loading the player first."""
+        values = {Player.kills: Player.kills + kills}
+        if name is not None:
+            values[Player.name] = name
+        Player.query.filter_by(steam_id=steam_id).update(values, synchronize_session=False)
+
+    @staticmethod
+    def get_top_killers(limit=10):
+        return Player.query.order_by(Player.kills.desc()).limit(limit).all()
+
+    def __repr__(self):
+        return 'Player(steam_id={}, name={}, kills={})'.format(
+            self.steam_id, self.name, self.kills)
+
+
+class StatAverage(db.Model):
+    """Averages player ratings are measured against.
+
+    These are recalibrated from all saved stats by player_ratings.py.
+    """
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Float, nullable=False)
+
+    # Averages of HLTV's rating 1.0, used until the first recalibration.
+    DEFAULT_RATING_AVERAGES = {
+        'kpr': 0.679,
+        'spr': 0.317,
+        'rmk': 1.277,
+    }
+    CACHE_KEY = 'stat_averages'
 
-@cache.memoize(timeout=60 * 60 * 12)  # 0.5 day timeout
-def get_steam_name(steam64):
-    url = 'http://api.steampowered.com/ISteamUser/GetPlayerSummaries/v0002/?key={}&steamids={}'
-    url = url.format(app.config['STEAM_API_KEY'], steam64)
-    response = requests.get(url)
-    if response.status_code == 200:
-        try:
-            player_list = response.json()['response']['players']
-            return player_list[0]['personaname']
-        except (KeyError, IndexError):
+    @staticmethod
+    def get_rating_averages():
+        averages = cache.get(StatAverage.CACHE_KEY)
+        if averages is None:
+            averages = dict(StatAverage.DEFAULT_RATING_AVERAGES)
+            averages.update((average.name, average.value) for average in StatAverage.query)
+            cache.set(StatAverage.CACHE_KEY, averages, timeout=300)
+        return averages
+
+    @staticmethod
+    def set_values(values):
+        for name, value in values.items():
+            db.session.merge(StatAverage(name=name, value=value))
+        cache.delete(StatAverage.CACHE_KEY)
+
+    def __repr__(self):
+        return 'StatAverage(name={}, value={})'.format(self.name, self.value)
+
+
+class TeamRating(db.Model):
+    """Precomputed Elo rating of every team that finished a rated match."""
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True,
+                        autoincrement=False)
+    rating = db.Column(db.Float, nullable=False, index=True)
+    matches = db.Column(db.Integer, default=0, nullable=False)
+    team = db.relationship('Team')
+
+    @staticmethod
+    def get_or_create(team_id, initial_rating):
+        rv = TeamRating.query.get(team_id)
+        if rv is None:
+            rv = TeamRating(team_id=team_id, rating=initial_rating, matches=0)
+            db.session.add(rv)
+        return rv
+
+    @staticmethod
+    def get_rankings():
+        return TeamRating.query.options(db.joinedload(TeamRating.team)).order_by(
+            TeamRating.rating.desc(), TeamRating.team_id)
+
+    def __repr__(self):
+        return 'TeamRating(team_id={}, rating={:.1f}, matches={})'.format(
+            self.team_id, self.rating, self.matches)
+
+
+class TeamMapStats(db.Model):
+    """Results of a team on each map it finished, kept up to date on map finish."""
+    team_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True,
+                        autoincrement=False)
+    map_name = db.Column(db.String(64), primary_key=True)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    losses = db.Column(db.Integer, default=0, nullable=False)
+    rounds_won = db.Column(db.Integer, default=0, nullable=False)
+    rounds_lost = db.Column(db.Integer, default=0, nullable=False)
+    last_played = db.Column(db.DateTime)
+    picks = db.Column(db.Integer, default=0, nullable=False)
+    bans = db.Column(db.Integer, default=0, nullable=False)
+
+    @staticmethod
+    def add_veto(team_id, map_name, action):
+        """Counts a pick or ban of the map by the team."""
+        column = TeamMapStats.picks if action == 'pick' else TeamMapStats.bans
+        updated = TeamMapStats.query.filter_by(team_id=team_id, map_name=map_name).update(
+            {column: column + 1}, synchronize_session=False)
+        if not updated:
+            db.session.add(TeamMapStats(team_id=team_id, map_name=map_name, wins=0, losses=0,
+                                        rounds_won=0, rounds_lost=0,
+                                        picks=int(action == 'pick'), bans=int(action == 'ban')))
+
+    @staticmethod
+    def add_result(team_id, map_name, won, lost, rounds_won, rounds_lost, played_at):
+        """Adds a finished map to the team's totals without loading them first."""
+        updated = TeamMapStats.query.filter_by(team_id=team_id, map_name=map_name).update({
+            TeamMapStats.wins: TeamMapStats.wins + int(won),
+            TeamMapStats.losses: TeamMapStats.losses + int(lost),
+            TeamMapStats.rounds_won: TeamMapStats.rounds_won + rounds_won,
+            TeamMapStats.rounds_lost: TeamMapStats.rounds_lost + rounds_lost,
+            TeamMapStats.last_played: played_at,
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(TeamMapStats(team_id=team_id, map_name=map_name,
+                                        wins=int(won), losses=int(lost),
+                                        rounds_won=rounds_won, rounds_lost=rounds_lost,
+                                        last_played=played_at, picks=0, bans=0))
+
+    @staticmethod
+    def get_for_team(team_id):
+        return TeamMapStats.query.filter_by(team_id=team_id).order_by(
+            (TeamMapStats.wins + TeamMapStats.losses).desc(), TeamMapStats.map_name).all()
+
+    def get_played(self):
+        return self.wins + self.losses
+
+    def get_win_rate(self):
+        if self.get_played() == 0:
+            return 0.0
+        return float(self.wins) / self.get_played()
+
+    def get_round_diff(self):
+        return self.rounds_won - self.rounds_lost
+
+    @staticmethod
+    def get_veto_rates(results):
+        """Returns {map_name: (pick rate, ban rate)}, as shares of the team's picks and bans."""
+        total_picks = sum(r.picks for r in results)
+        total_bans = sum(r.bans for r in results)
+        return {r.map_name: (float(r.picks) / total_picks if total_picks else 0.0,
+                             float(r.bans) / total_bans if total_bans else 0.0)
+                for r in results}
+
+    def __repr__(self):
+        return 'TeamMapStats(team_id={}, map_name={}, {}-{})'.format(
+            self.team_id, self.map_name, self.wins, self.losses)
+
+
+class MapPoolStats(db.Model):
+    """How often each map was played, across all matches."""
+    map_name = db.Column(db.String(64), primary_key=True)
+    played = db.Column(db.Integer, default=0, nullable=False)
+    last_played = db.Column(db.DateTime)
+    picks = db.Column(db.Integer, default=0, nullable=False)
+    bans = db.Column(db.Integer, default=0, nullable=False)
+
+    @staticmethod
+    def add_played(map_name, played_at):
+        updated = MapPoolStats.query.filter_by(map_name=map_name).update({
+            MapPoolStats.played: MapPoolStats.played + 1,
+            MapPoolStats.last_played: played_at,
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(MapPoolStats(map_name=map_name, played=1, last_played=played_at,
+                                        picks=0, bans=0))
+
+    @staticmethod
+    def add_veto(map_name, action):
+        column = MapPoolStats.picks if action == 'pick' else MapPoolStats.bans
+        updated = MapPoolStats.query.filter_by(map_name=map_name).update(
+            {column: column + 1}, synchronize_session=False)
+        if not updated:
+            db.session.add(MapPoolStats(map_name=map_name, played=0,
+                                        picks=int(action == 'pick'), bans=int(action == 'ban')))
+
+    @staticmethod
+    def get_popularity():
+        return MapPoolStats.query.order_by(MapPoolStats.played.desc(), MapPoolStats.map_name).all()
+
+    def __repr__(self):
+        return 'MapPoolStats(map_name={}, played={})'.format(self.map_name, self.played)
+
+
+class HeadToHead(db.Model):
+    """Results between two teams, kept up to date on match finish.
+
+    Each pair of teams has a single row, stored with the lower team id as
+    team a, so looking up a pair is a primary key lookup in either order.
+    """
+    team_a_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True,
+                          autoincrement=False)
+    team_b_id = db.Column(db.Integer, db.ForeignKey('team.id'), primary_key=True,
+                          autoincrement=False)
+    series_a = db.Column(db.Integer, default=0, nullable=False)
+    series_b = db.Column(db.Integer, default=0, nullable=False)
+    series_draws = db.Column(db.Integer, default=0, nullable=False)
+    maps_a = db.Column(db.Integer, default=0, nullable=False)
+    maps_b = db.Column(db.Integer, default=0, nullable=False)
+    last_match_id = db.Column(db.Integer, db.ForeignKey('match.id'))
+    last_played = db.Column(db.DateTime)
+
+    @staticmethod
+    def add_match(match):
+        """Adds a just finished match to the record of its two teams."""
+        if match.team1_id is None or match.team2_id is None or match.team1_id == match.team2_id:
+            return
+
+        if match.team1_id < match.team2_id:
+            team_a_id, team_b_id = match.team1_id, match.team2_id
+            maps_a, maps_b = match.team1_score or 0, match.team2_score or 0
+        else:
+            team_a_id, team_b_id = match.team2_id, match.team1_id
+            maps_a, maps_b = match.team2_score or 0, match.team1_score or 0
+        series_a = int(match.winner == team_a_id)
+        series_b = int(match.winner == team_b_id)
+        series_draws = int(match.winner is None)
+
+        updated = HeadToHead.query.filter_by(team_a_id=team_a_id, team_b_id=team_b_id).update({
+            HeadToHead.series_a: HeadToHead.series_a + series_a,
+            HeadToHead.series_b: HeadToHead.series_b + series_b,
+            HeadToHead.series_draws: HeadToHead.series_draws + series_draws,
+            HeadToHead.maps_a: HeadToHead.maps_a + maps_a,
+            HeadToHead.maps_b: HeadToHead.maps_b + maps_b,
+            HeadToHead.last_match_id: match.id,
+            HeadToHead.last_played: match.end_time,
+        }, synchronize_session=False)
+        if not updated:
+            db.session.add(HeadToHead(team_a_id=team_a_id, team_b_id=team_b_id,
+                                      series_a=series_a, series_b=series_b,
+                                      series_draws=series_draws, maps_a=maps_a, maps_b=maps_b,
+                                      last_match_id=match.id, last_played=match.end_time))
+
+    @staticmethod
+    def get_record(team_id, other_team_id):
+        """Returns the results between two teams from team_id's side, or None."""
+        row = HeadToHead.query.get((min(team_id, other_team_id), max(team_id, other_team_id)))
+        if row is None:
             return None
+        if team_id <= other_team_id:
+            return row.get_dict(row.series_a, row.series_b, row.maps_a, row.maps_b)
+        return row.get_dict(row.series_b, row.series_a, row.maps_b, row.maps_a)
+
+    def get_dict(self, series_won, series_lost, maps_won, maps_lost):
+        return {
+            'series_won': series_won,
+            'series_lost': series_lost,
+            'series_drawn': self.series_draws,
+            'maps_won': maps_won,
+            'maps_lost': maps_lost,
+            'last_match_id': self.last_match_id,
+            'last_played': self.last_played,
+        }
 
-    return None
+    def __repr__(self):
+        return 'HeadToHead(team_a_id={}, team_b_id={}, series={}-{})'.format(
+            self.team_a_id, self.team_b_id, self.series_a, self.series_b)
+
+
+class RoundSnapshot(db.Model):
+    """The score of a map after each of its rounds, for round-by-round timelines.
+
+    Rows are only ever added, one per round, and keyed by (map_id,
+    round_number) so a map's whole timeline is a single primary key range.
+    They are buffered with the live score and written when it is flushed,
+    see livescores.py.
+    """
+    map_id = db.Column(db.Integer, db.ForeignKey('map_stats.id'), primary_key=True,
+                       autoincrement=False)
+    round_number = db.Column(db.SmallInteger, primary_key=True, autoincrement=False)
+    team1_score = db.Column(db.SmallInteger, nullable=False)
+    team2_score = db.Column(db.SmallInteger, nullable=False)
+    seconds = db.Column(db.Integer, nullable=False)  # Since the map started
+
+    @staticmethod
+    def add_rounds(map_stats, rounds):
+        """Inserts buffered timeline rows, given as dicts of the columns.
+
+        Rounds that are already recorded (e.g. sent again after the buffer
+        was lost) are skipped. Returns True if any row was added.
+        """
+        if not rounds:
+            return False
+
+        numbers = [r['round_number'] for r in rounds]
+        existing = {number for number, in db.session.query(RoundSnapshot.round_number).filter(
+            RoundSnapshot.map_id == map_stats.id, RoundSnapshot.round_number.in_(numbers))}
+        rows = [dict(r, map_id=map_stats.id) for r in rounds
+                if r['round_number'] not in existing]
+        if rows:
+            db.session.bulk_insert_mappings(RoundSnapshot, rows)
+        return bool(rows)
+
+    @staticmethod
+    def get_timeline(map_id):
+        return RoundSnapshot.query.filter_by(map_id=map_id).order_by(
+            RoundSnapshot.round_number).all()
+
+    def __repr__(self):
+        return 'RoundSnapshot(map_id={}, round_number={}, score={}-{})'.format(
+            self.map_id, self.round_number, self.team1_score, self.team2_score)
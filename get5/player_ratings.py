@@ -0,0 +1,124 @@
+"""Batch recompute of every player's rating, ADR, KPR and HS%.
+
+Run ``python -m get5.player_ratings`` after changing the rating formula, or
+now and then to recalibrate the averages ratings are measured against.
+Player stats are streamed in chunks of plain columns, computed with numpy and
+written back with one executemany per chunk.
+"""
+
+import sys
+import time
+
+from get5 import db
+from . import fragments
+from .models import PlayerStats, StatAverage
+
+CHUNK_SIZE = 20000
+
+STAT_COLUMNS = ['kills', 'deaths', 'roundsplayed', 'headshot_kills', 'damage',
+                'k1', 'k2', 'k3', 'k4', 'k5']
+
+
+def _coalesced(column):
+    return db.func.coalesce(getattr(PlayerStats, column), 0)
+
+
+def calibrate():
+    """Returns the average kills, survivals and multikill score per round.
+
+    Weighted by rounds played, with a single aggregate query. Falls back to
+    the default averages if there are no rounds at all.
+    """
+    rounds, kills, deaths, multikills = db.session.query(
+        db.func.sum(_coalesced('roundsplayed')),
+        db.func.sum(_coalesced('kills')),
+        db.func.sum(_coalesced('deaths')),
+        db.func.sum(_coalesced('k1') + 4 * _coalesced('k2') + 9 * _coalesced('k3') +
+                    16 * _coalesced('k4') + 25 * _coalesced('k5')),
+    ).one()
+
+    averages = dict(StatAverage.DEFAULT_RATING_AVERAGES)
+    if rounds and kills and multikills and rounds > deaths:
+        averages['kpr'] = float(kills) / rounds
+        averages['spr'] = float(rounds - deaths) / rounds
+        averages['rmk'] = float(multikills) / rounds
+    return averages
+
+
+def compute(stats, averages):
+    """Computes the derived columns for a chunk of rows.
+
+    stats maps each of STAT_COLUMNS to an integer array. Returns a dict of
+    float arrays, with NaN where a value is undefined.
+    """
+    import numpy as np
+
+    rounds = stats['roundsplayed'].astype(np.float64)
+    kills = stats['kills'].astype(np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_round = np.where(rounds > 0, 1.0 / rounds, np.nan)
+        multikills = (stats['k1'] + 4 * stats['k2'] + 9 * stats['k3'] +
+                      16 * stats['k4'] + 25 * stats['k5'])
+        rating = (kills * per_round / averages['kpr'] +
+                  0.7 * (rounds - stats['deaths']) * per_round / averages['spr'] +
+                  multikills * per_round / averages['rmk']) / 2.7
+        hsp = np.where(kills > 0, stats['headshot_kills'] / kills, 0.0)
+
+    return {
+        'rating': rating,
+        'adr': np.nan_to_num(stats['damage'] * per_round),
+        'kpr': np.nan_to_num(kills * per_round),
+        'hsp': hsp,
+    }
+
+
+def iter_chunks(chunk_size=CHUNK_SIZE):
+    """Yields (ids, stats) for every player stats row, in chunks of arrays."""
+    import numpy as np
+
+    columns = [PlayerStats.id] + [_coalesced(column) for column in STAT_COLUMNS]
+    last_id = 0
+    while True:
+        rows = db.session.query(*columns).filter(PlayerStats.id > last_id).order_by(
+            PlayerStats.id).limit(chunk_size).all()
+        if not rows:
+            return
+        data = np.array(rows, dtype=np.int64)
+        last_id = int(data[-1, 0])
+        yield data[:, 0], {column: data[:, i + 1] for i, column in enumerate(STAT_COLUMNS)}
+
+
+def recompute(chunk_size=CHUNK_SIZE):
+    """Recalibrates the averages and rewrites the derived columns of every row.
+
+    Returns the number of rows written.
+    """
+    import numpy as np
+
+    averages = calibrate()
+    StatAverage.set_values(averages)
+    db.session.commit()
+
+    count = 0
+    for ids, stats in iter_chunks(chunk_size):
+        derived = compute(stats, averages)
+        mappings = []
+        for i, row_id in enumerate(ids.tolist()):
+            mapping = {'id': row_id}
+            for column, values in derived.items():
+                value = values[i]
+                mapping[column] = None if np.isnan(value) else float(value)
+            mappings.append(mapping)
+        db.session.bulk_update_mappings(PlayerStats, mappings)
+        db.session.commit()
+        count += len(mappings)
+
+    # Finished scoreboards are cached with the ratings they show.
+    fragments.invalidate('player_ratings', 0)
+    return count
+
+
+if __name__ == '__main__':
+    start = time.time()
+    count = recompute()
+    sys.stdout.write('Recomputed {} player stats in {:.2f}s\n'.format(count, time.time() - start))
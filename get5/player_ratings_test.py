@@ -0,0 +1,52 @@
+import unittest
+
+from . import get5_test
+from . import player_ratings
+from .models import Match, PlayerStats, StatAverage
+
+
+class PlayerRatingsTests(get5_test.Get5Test):
+
+    def update_player(self, steam_id, **stats):
+        match = Match.query.get(1)
+        data = dict(stats, team='team1', key=match.api_key)
+        url = '/match/1/map/0/player/{}/update'.format(steam_id)
+        self.assertEqual(self.app.post(url, data=data).status_code, 200)
+
+    def test_recompute(self):
+        match = Match.query.get(1)
+        data = {'mapname': 'de_dust2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+
+        self.update_player('76561198053858673', roundsplayed=10, kills=8, deaths=5,
+                           headshot_kills=4, damage=900, **{'1kill_rounds': 4, '2kill_rounds': 2})
+        self.update_player('76561198053858674', roundsplayed=0)
+
+        self.assertEqual(player_ratings.recompute(chunk_size=1), 2)
+
+        # A single player is exactly as good as the recalibrated average
+        averages = StatAverage.get_rating_averages()
+        self.assertAlmostEqual(averages['kpr'], 0.8)
+        self.assertAlmostEqual(averages['spr'], 0.5)
+        self.assertAlmostEqual(averages['rmk'], 1.2)
+
+        player = PlayerStats.query.filter_by(steam_id='76561198053858673').first()
+        self.assertAlmostEqual(player.rating, 1.0)
+        self.assertAlmostEqual(player.adr, 90.0)
+        self.assertAlmostEqual(player.kpr, 0.8)
+        self.assertAlmostEqual(player.hsp, 0.5)
+
+        player = PlayerStats.query.filter_by(steam_id='76561198053858674').first()
+        self.assertIsNone(player.rating)
+        self.assertEqual(player.adr, 0.0)
+
+        # Stored values are dropped once the stats change again
+        self.update_player('76561198053858673', roundsplayed=11, kills=8, deaths=6,
+                           headshot_kills=4, damage=900, **{'1kill_rounds': 4, '2kill_rounds': 2})
+        player = PlayerStats.query.filter_by(steam_id='76561198053858673').first()
+        self.assertIsNone(player.rating)
+        self.assertAlmostEqual(player.get_fpr(), 8 / 11.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
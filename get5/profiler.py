@@ -0,0 +1,194 @@
+import cProfile
+import datetime
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from flask import Blueprint, render_template, g, send_from_directory, abort
+import sqlalchemy
+from sqlalchemy.engine import Engine
+
+from get5 import app, BadRequestError, config_setting
+
+profiler_blueprint = Blueprint('profiler', __name__)
+
+_local = threading.local()
+_slug_re = re.compile('[^a-zA-Z0-9]+')
+
+
+@sqlalchemy.event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    for counter in getattr(_local, 'query_counters', ()):
+        counter.count += 1
+        counter.statements.append(statement)
+
+
+class QueryCounter(object):
+    """Counts the SQL statements executed by the current thread.
+
+    Usage:
+        with QueryCounter() as queries:
+            ...
+        print(queries.count, queries.statements)
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.statements = []
+
+    def __enter__(self):
+        if not hasattr(_local, 'query_counters'):
+            _local.query_counters = []
+        _local.query_counters.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _local.query_counters.remove(self)
+
+
+class ProfilerMiddleware(object):
+    """WSGI middleware that runs cProfile on a sample of requests.
+
+    A request is profiled if its path starts with one of the given routes, if
+    it carries an X-Get5-Profile header matching header_key, or otherwise
+    with probability sample_rate. Each profile is saved as a pstats file next
+    to a json file with the route, status, duration and number of SQL
+    queries. The pstats files can be turned into flamegraphs with tools like
+    flameprof or snakeviz.
+    """
+
+    def __init__(self, wsgi_app, profile_dir, sample_rate=0.0, routes=None,
+                 header_key=None, max_profiles=200):
+        self.wsgi_app = wsgi_app
+        self.profile_dir = profile_dir
+        self.sample_rate = sample_rate
+        self.routes = tuple(routes or ())
+        self.header_key = header_key
+        self.max_profiles = max_profiles
+
+        if not os.path.isdir(profile_dir):
+            os.makedirs(profile_dir)
+
+    def should_profile(self, environ):
+        path = environ.get('PATH_INFO', '')
+        if path.startswith('/static/') or path.startswith('/admin/profiles'):
+            return False
+        if self.routes and path.startswith(self.routes):
+            return True
+        if self.header_key and environ.get('HTTP_X_GET5_PROFILE') == self.header_key:
+            return True
+        return random.random() < self.sample_rate
+
+    def __call__(self, environ, start_response):
+        if not self.should_profile(environ):
+            return self.wsgi_app(environ, start_response)
+
+        status = []
+
+        def profiled_start_response(status_line, headers, exc_info=None):
+            status.append(status_line)
+            return start_response(status_line, headers, exc_info)
+
+        profile = cProfile.Profile()
+        start = time.time()
+        with QueryCounter() as queries:
+            profile.enable()
+            try:
+                # Consume the body here so template rendering is profiled too.
+                iterable = self.wsgi_app(environ, profiled_start_response)
+                try:
+                    body = list(iterable)
+                finally:
+                    if hasattr(iterable, 'close'):
+                        iterable.close()
+            finally:
+                profile.disable()
+
+        self.save(profile, {
+            'method': environ.get('REQUEST_METHOD'),
+            'path': environ.get('PATH_INFO'),
+            'query_string': environ.get('QUERY_STRING'),
+            'status': status[0] if status else None,
+            'duration_ms': round((time.time() - start) * 1000.0, 1),
+            'sql_queries': queries.count,
+            'time': datetime.datetime.utcnow().isoformat(),
+        })
+        return body
+
+    def save(self, profile, info):
+        name = '{}-{}-{}'.format(
+            datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S%f'),
+            info['method'], _slug_re.sub('_', info['path']).strip('_') or 'root')
+        try:
+            profile.dump_stats(os.path.join(self.profile_dir, name + '.prof'))
+            with open(os.path.join(self.profile_dir, name + '.json'), 'w') as f:
+                json.dump(info, f)
+            self.prune()
+        except (IOError, OSError) as e:
+            app.logger.error('Failed to save request profile: {}'.format(e))
+
+    def prune(self):
+        names = list_profiles(self.profile_dir)
+        for name in names[self.max_profiles:]:
+            for ext in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.profile_dir, name + ext))
+                except OSError:
+                    pass
+
+
+def get_profile_dir():
+    return config_setting('PROFILE_DIR') or os.path.join(app.instance_path, 'profiles')
+
+
+def list_profiles(profile_dir):
+    """Returns the saved profile names, newest first."""
+    if not os.path.isdir(profile_dir):
+        return []
+    names = [os.path.splitext(f)[0] for f in os.listdir(profile_dir) if f.endswith('.json')]
+    return sorted(names, reverse=True)
+
+
+def init_app(app):
+    sample_rate = config_setting('PROFILE_SAMPLE_RATE')
+    routes = config_setting('PROFILE_ROUTES')
+    header_key = config_setting('PROFILE_HEADER_KEY')
+    if not (sample_rate or routes or header_key):
+        return
+
+    app.wsgi_app = ProfilerMiddleware(
+        app.wsgi_app, get_profile_dir(), sample_rate=sample_rate, routes=routes,
+        header_key=header_key, max_profiles=config_setting('PROFILE_MAX_FILES'))
+    app.logger.info('Request profiling enabled, saving profiles to {}'.format(
+        get_profile_dir()))
+
+
+def admin_check(user):
+    if user is None or not user.admin:
+        raise BadRequestError('You do not have access to this page')
+
+
+@profiler_blueprint.route('/admin/profiles')
+def profiles():
+    admin_check(g.user)
+    profile_dir = get_profile_dir()
+    profile_list = []
+    for name in list_profiles(profile_dir):
+        try:
+            with open(os.path.join(profile_dir, name + '.json')) as f:
+                profile_list.append((name, json.load(f)))
+        except (IOError, OSError, ValueError):
+            continue
+
+    return render_template('profiles.html', user=g.user, profiles=profile_list)
+
+
+@profiler_blueprint.route('/admin/profiles/<name>.prof')
+def profile_download(name):
+    admin_check(g.user)
+    if name not in list_profiles(get_profile_dir()):
+        abort(404)
+    return send_from_directory(get_profile_dir(), name + '.prof', as_attachment=True)
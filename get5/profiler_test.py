@@ -0,0 +1,55 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import get5
+from . import get5_test
+from . import profiler
+from .models import Match
+
+
+class ProfilerTests(get5_test.Get5Test):
+
+    def setUp(self):
+        super(ProfilerTests, self).setUp()
+        self.profile_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.profile_dir)
+        super(ProfilerTests, self).tearDown()
+
+    def test_query_counter(self):
+        with profiler.QueryCounter() as queries:
+            Match.query.get(1)
+        self.assertEqual(queries.count, 1)
+
+    def test_profile_route(self):
+        wsgi_app = get5.app.wsgi_app
+        get5.app.wsgi_app = profiler.ProfilerMiddleware(
+            wsgi_app, self.profile_dir, routes=['/matches'])
+        try:
+            self.assertEqual(self.app.get('/matches').status_code, 200)
+            self.assertEqual(self.app.get('/teams').status_code, 200)
+        finally:
+            get5.app.wsgi_app = wsgi_app
+
+        names = profiler.list_profiles(self.profile_dir)
+        self.assertEqual(len(names), 1)
+        self.assertTrue(os.path.exists(os.path.join(self.profile_dir, names[0] + '.prof')))
+        with open(os.path.join(self.profile_dir, names[0] + '.json')) as f:
+            info = json.load(f)
+        self.assertEqual(info['path'], '/matches')
+        self.assertGreater(info['sql_queries'], 0)
+
+    def test_profiles_page_admin_only(self):
+        self.assertEqual(self.app.get('/admin/profiles').status_code, 400)
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 1
+            self.assertEqual(c.get('/admin/profiles').status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+"""Elo ratings of teams, based on the results of finished matches.
+
+Ratings are updated one match at a time as matches finish, and can be
+recomputed from the whole match history with ``python -m get5.ratings``
+(e.g. after changing K_FACTOR).
+"""
+
+import sys
+import time
+
+from get5 import db
+from .models import Match, TeamRating
+
+INITIAL_RATING = 1500.0
+K_FACTOR = 32.0
+
+
+def expected_score(rating, opponent_rating):
+    """Chance of winning against the opponent, works on numpy arrays too."""
+    return 1.0 / (1.0 + 10 ** ((opponent_rating - rating) / 400.0))
+
+
+def get_result(match):
+    """Returns team1's score (1, 0.5 or 0), or None if the match isn't rated."""
+    return _result(match.team1_id, match.team2_id, match.winner, match.forfeit)
+
+
+def _result(team1_id, team2_id, winner, forfeit):
+    # Forfeits say nothing about team strength.
+    if team1_id is None or team2_id is None or team1_id == team2_id or forfeit:
+        return None
+    if winner == team1_id:
+        return 1.0
+    elif winner == team2_id:
+        return 0.0
+    elif winner is None:
+        return 0.5
+    return None
+
+
+def update_for_match(match):
+    """Applies the result of a just finished match to both teams' ratings."""
+    score = get_result(match)
+    if score is None:
+        return
+
+    rating1 = TeamRating.get_or_create(match.team1_id, INITIAL_RATING)
+    rating2 = TeamRating.get_or_create(match.team2_id, INITIAL_RATING)
+    delta = K_FACTOR * (score - expected_score(rating1.rating, rating2.rating))
+    rating1.rating += delta
+    rating2.rating -= delta
+    rating1.matches += 1
+    rating2.matches += 1
+
+
+def compute_ratings(team1, team2, scores, num_teams):
+    """Replays a match history, given as arrays in the order matches finished.
+
+    team1 and team2 hold dense team indexes (0 to num_teams - 1), scores
+    holds team1's score of each match. Returns the final ratings and the
+    number of matches of each team.
+
+    A match only depends on the earlier matches of its two teams, so matches
+    are grouped into generations in which no team plays twice, and every
+    generation is applied to the rating array at once.
+    """
+    import numpy as np
+
+    ratings = np.full(num_teams, INITIAL_RATING)
+    if len(scores) == 0:
+        return ratings, np.zeros(num_teams, dtype=np.int64)
+
+    next_generation = [0] * num_teams
+    generations = []
+    for a, b in zip(team1.tolist(), team2.tolist()):
+        generation = max(next_generation[a], next_generation[b])
+        generations.append(generation)
+        next_generation[a] = next_generation[b] = generation + 1
+
+    order = np.argsort(np.array(generations), kind='mergesort')
+    team1, team2, scores = team1[order], team2[order], scores[order]
+    boundaries = np.flatnonzero(np.diff(np.array(generations)[order])) + 1
+    for a, b, s in zip(np.split(team1, boundaries), np.split(team2, boundaries),
+                       np.split(scores, boundaries)):
+        delta = K_FACTOR * (s - expected_score(ratings[a], ratings[b]))
+        ratings[a] += delta
+        ratings[b] -= delta
+
+    matches = np.bincount(np.concatenate((team1, team2)), minlength=num_teams)
+    return ratings, matches
+
+
+def recompute():
+    """Rebuilds every team rating from all finished matches.
+
+    Only the needed columns are loaded, never Match objects. Returns the
+    number of rated matches.
+    """
+    import numpy as np
+
+    rows = db.session.query(Match.team1_id, Match.team2_id, Match.winner, Match.forfeit).filter(
+        Match.end_time != None, Match.cancelled == False).order_by(  # noqa: E711,E712
+        Match.end_time, Match.id).all()
+
+    team1, team2, scores = [], [], []
+    for team1_id, team2_id, winner, forfeit in rows:
+        score = _result(team1_id, team2_id, winner, forfeit)
+        if score is not None:
+            team1.append(team1_id)
+            team2.append(team2_id)
+            scores.append(score)
+
+    team_ids, indexes = np.unique(np.array(team1 + team2, dtype=np.int64), return_inverse=True)
+    count = len(scores)
+    ratings, matches = compute_ratings(indexes[:count], indexes[count:],
+                                       np.array(scores, dtype=np.float64), len(team_ids))
+
+    TeamRating.query.delete()
+    db.session.bulk_insert_mappings(TeamRating, [
+        {'team_id': int(team_id), 'rating': float(rating), 'matches': int(num_matches)}
+        for team_id, rating, num_matches in zip(team_ids, ratings, matches)])
+    db.session.commit()
+    return count
+
+
+if __name__ == '__main__':
+    start = time.time()
+    count = recompute()
+    sys.stdout.write('Rated {} matches in {:.2f}s\n'.format(count, time.time() - start))
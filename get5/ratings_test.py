@@ -0,0 +1,63 @@
+import random
+import unittest
+
+import numpy as np
+
+from . import get5_test
+from . import ratings
+from .models import Match, TeamRating
+
+
+class RatingsTests(get5_test.Get5Test):
+
+    def finish_match(self, **data):
+        match = Match.query.get(1)
+        data.update({'winner': 'team1', 'key': match.api_key})
+        self.assertEqual(self.app.post('/match/1/finish', data=data).status_code, 200)
+
+    def test_rating_updated_on_finish(self):
+        self.finish_match()
+        self.assertAlmostEqual(TeamRating.query.get(1).rating, 1516.0)
+        self.assertAlmostEqual(TeamRating.query.get(2).rating, 1484.0)
+        self.assertEqual(TeamRating.query.get(1).matches, 1)
+        self.assertEqual([r.team_id for r in TeamRating.get_rankings()], [1, 2])
+        self.assertEqual(self.app.get('/rankings').status_code, 200)
+
+    def test_forfeit_not_rated(self):
+        self.finish_match(forfeit='1')
+        match = Match.query.get(1)
+        self.assertTrue(match.forfeit)
+        self.assertEqual((match.team1_score, match.team2_score), (1, 0))
+        self.assertEqual(TeamRating.query.count(), 0)
+
+    def test_recompute_matches_incremental(self):
+        self.finish_match()
+        incremental = {r.team_id: r.rating for r in TeamRating.query}
+        self.assertEqual(ratings.recompute(), 1)
+        for r in TeamRating.query:
+            self.assertAlmostEqual(r.rating, incremental[r.team_id])
+
+    def test_compute_ratings(self):
+        # The batched replay gives the same result as one match at a time
+        rng = random.Random(5)
+        num_teams = 8
+        history = []
+        for _ in range(200):
+            a, b = rng.sample(range(num_teams), 2)
+            history.append((a, b, rng.choice([0.0, 0.5, 1.0])))
+
+        expected = [ratings.INITIAL_RATING] * num_teams
+        for a, b, score in history:
+            delta = ratings.K_FACTOR * (score - ratings.expected_score(expected[a], expected[b]))
+            expected[a] += delta
+            expected[b] -= delta
+
+        team1, team2, scores = (np.array(column) for column in zip(*history))
+        result, matches = ratings.compute_ratings(team1, team2, scores, num_teams)
+        for i in range(num_teams):
+            self.assertAlmostEqual(result[i], expected[i])
+        self.assertEqual(matches.sum(), 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
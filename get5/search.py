@@ -0,0 +1,76 @@
+import re
+
+from get5 import db
+from .models import Team, Player, Match
+from . import util
+
+from flask import Blueprint, request, render_template, g
+
+search_blueprint = Blueprint('search', __name__)
+
+RESULTS_PER_KIND = 10
+MAX_WORDS = 8
+
+_word_re = re.compile(r'\w+', re.UNICODE)
+
+
+def _document(*columns):
+    """The text search document of some columns.
+
+    On Postgres this must stay identical to the expressions of the GIN
+    indexes created in migration 8c6e2a4f7d19, or they won't be used.
+    """
+    text = db.func.coalesce(columns[0], '')
+    for column in columns[1:]:
+        text = text + ' ' + db.func.coalesce(column, '')
+    return db.func.to_tsvector(db.literal_column("'simple'"), text)
+
+
+def _matches(columns, words):
+    """Filter for rows where every word starts a word in one of the columns."""
+    if db.engine.dialect.name == 'postgresql':
+        # Matched through a GIN index, ':*' makes every word a prefix match.
+        query = ' & '.join('{}:*'.format(word) for word in words)
+        return _document(*columns).op('@@')(
+            db.func.to_tsquery(db.literal_column("'simple'"), query))
+
+    # Elsewhere each word is looked for anywhere in the columns. This scans
+    # the tables, which is fine for the small databases SQLite is used for.
+    return db.and_(*[
+        db.or_(*[column.like(util.like_contains(word), escape='\\') for column in columns])
+        for word in words])
+
+
+def get_words(text):
+    return [word.lower() for word in _word_re.findall(text or '')][:MAX_WORDS]
+
+
+def search(text, limit=RESULTS_PER_KIND):
+    """Returns the teams, players and matches matching every word of text."""
+    results = {'teams': [], 'players': [], 'matches': []}
+    words = get_words(text)
+    if not words:
+        return results
+
+    results['teams'] = Team.query.filter(_matches([Team.name, Team.tag], words)).order_by(
+        Team.name).limit(limit).all()
+
+    # A steamid64 is looked up directly by primary key.
+    text = text.strip()
+    if text.isdigit():
+        player = Player.query.get(text)
+        results['players'] = [player] if player else []
+    else:
+        results['players'] = Player.query.filter(_matches([Player.name], words)).order_by(
+            Player.kills.desc()).limit(limit).all()
+
+    results['matches'] = Match.query.filter(
+        Match.cancelled == False, _matches([Match.title], words)).order_by(  # noqa: E712
+        Match.id.desc()).limit(limit).all()
+    return results
+
+
+@search_blueprint.route('/search', methods=['GET'])
+def search_page():
+    text = request.values.get('q', '')
+    return render_template('search.html', user=g.user, query=text, results=search(text))
@@ -0,0 +1,48 @@
+import json
+import unittest
+
+from get5 import db
+from . import get5_test
+from . import search
+from .models import Player
+
+
+class SearchTests(get5_test.Get5Test):
+
+    def setUp(self):
+        super(SearchTests, self).setUp()
+        player = Player.get_or_create('76561198053858673')
+        player.name = 'splewis'
+        db.session.commit()
+
+    def test_search(self):
+        results = search.search('fnat')
+        self.assertEqual([t.name for t in results['teams']], ['Fnatic'])
+        self.assertEqual(results['players'], [])
+
+        results = search.search('SPLEW')
+        self.assertEqual([p.steam_id for p in results['players']], ['76561198053858673'])
+
+        results = search.search('76561198053858673')
+        self.assertEqual([p.name for p in results['players']], ['splewis'])
+
+        # Every word has to match
+        self.assertEqual([m.id for m in search.search('map')['matches']], [1])
+        self.assertEqual(search.search('map fnatic')['matches'], [])
+
+        # Like wildcards are matched literally
+        self.assertEqual(search.search('%')['teams'], [])
+
+    def test_search_pages(self):
+        response = self.app.get('/search?q=envy')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'EnvyUs', response.data)
+
+        response = self.app.get('/api/v1/search?q=envy')
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.get_data().decode('utf8'))
+        self.assertEqual(data['teams'], [{'id': 1, 'name': 'EnvyUs', 'tag': 'EnvyUs'}])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,16 @@
-from get5 import app, db, flash_errors, config_setting
-from .models import GameServer
+from get5 import app, db, flash_errors, config_setting, BadRequestError
+from .models import GameServer, MetricCounter
 from . import util
 
-from flask import Blueprint, request, render_template, flash, g, redirect
+from flask import Blueprint, request, render_template, flash, g, redirect, jsonify
 
 from wtforms import Form, validators, StringField, IntegerField, BooleanField
 
 
 server_blueprint = Blueprint('server', __name__)
 
+SEARCH_RESULTS = 20
+
 
 class ServerForm(Form):
     display_name = StringField('Display Name',
@@ -125,11 +127,33 @@ def server_delete(serverid):
     for m in matches:
         m.server_id = None
 
-    GameServer.query.filter_by(id=serverid).delete()
+    deleted = GameServer.query.filter_by(id=serverid).delete()
+    MetricCounter.increment('servers', -deleted)
     db.session.commit()
     return redirect('myservers')
 
 
+@server_blueprint.route('/servers/search')
+def servers_search():
+    """Servers usable in a match whose name or ip starts with ?q=, for the match form."""
+    if not g.user:
+        raise BadRequestError('You must be logged in')
+
+    query = GameServer.query.filter(
+        (GameServer.public_server == True) | (GameServer.user_id == g.user.id))  # noqa: E712
+    prefix = request.values.get('q', '').strip()
+    if prefix:
+        # Served by lower() indexes on Postgres, see migration 2e7d9a4c6b15.
+        pattern = util.like_prefix(prefix.lower())
+        query = query.filter(
+            db.func.lower(GameServer.display_name).like(pattern, escape='\\') |
+            db.func.lower(GameServer.ip_string).like(pattern, escape='\\'))
+
+    servers = query.order_by(GameServer.display_name).limit(SEARCH_RESULTS)
+    return jsonify({'results': [{'id': server.id, 'name': server.get_display()}
+                                for server in servers]})
+
+
 @server_blueprint.route("/servers")
 def servers():
     page = util.as_int(request.values.get('page'), on_fail=1)
@@ -0,0 +1,163 @@
+import glob
+import json
+import math
+import os
+import re
+
+from flask import Markup
+
+from get5 import app
+from . import assets
+
+# Each sheet packs the pngs of a directory into a grid of equally sized cells.
+# Cells are positioned with percentages, so a sprite can be shown at any
+# size by only changing the element's width and height.
+SHEETS = {
+    'flag': (['img/valve_flags/*.png', 'img/_unknown.png'], (32, 21)),
+    'logo': (['img/logos/*.png'], (64, 64)),
+}
+SPRITE_DIR = 'img/sprites'
+INDEX_FILE = 'img/sprites/sprites.json'
+CSS_FILE = 'css/sprites.css'
+
+# Names end up in css class names, anything else is shown as a plain <img>.
+_name_re = re.compile('^[A-Za-z0-9_-]+$')
+_index = {}
+
+
+def _static_path(filename):
+    return os.path.join(app.static_folder, filename)
+
+
+def get_sources(kind):
+    """Returns a dict of name -> png path for everything on a sheet."""
+    patterns, _ = SHEETS[kind]
+    sources = {}
+    for pattern in patterns:
+        for path in glob.glob(_static_path(pattern)):
+            name = os.path.splitext(os.path.basename(path))[0]
+            if _name_re.match(name):
+                sources[name] = path
+    return sources
+
+
+def _write_atomic(path, data, mode='w'):
+    tmp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_path, mode) as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def build_sheet(kind):
+    """Draws a sheet and returns its index entry."""
+    # Pillow is only needed to build the sheets, not to serve them.
+    from PIL import Image
+
+    sources = get_sources(kind)
+    names = sorted(sources)
+    cell_width, cell_height = SHEETS[kind][1]
+    columns = max(1, int(math.ceil(math.sqrt(len(names)))))
+    rows = max(1, int(math.ceil(len(names) / float(columns))))
+
+    sheet = Image.new('RGBA', (columns * cell_width, rows * cell_height))
+    positions = {}
+    for i, name in enumerate(names):
+        row, column = divmod(i, columns)
+        with Image.open(sources[name]) as image:
+            image = image.convert('RGBA').resize((cell_width, cell_height), Image.LANCZOS)
+        sheet.paste(image, (column * cell_width, row * cell_height))
+        positions[name] = (
+            100.0 * column / (columns - 1) if columns > 1 else 0,
+            100.0 * row / (rows - 1) if rows > 1 else 0,
+        )
+
+    image_file = '{}/{}s.png'.format(SPRITE_DIR, kind)
+    tmp_path = '{}.{}.tmp.png'.format(_static_path(image_file), os.getpid())
+    sheet.save(tmp_path, optimize=True)
+    os.replace(tmp_path, _static_path(image_file))
+
+    return {
+        'image': image_file,
+        'columns': columns,
+        'rows': rows,
+        'positions': positions,
+    }
+
+
+def build_css(index):
+    lines = []
+    for kind, sheet in sorted(index.items()):
+        lines.append('.sprite-{}{{display:inline-block;background-image:url({});'
+                     'background-size:{}% {}%;background-repeat:no-repeat}}'.format(
+                         kind, assets.static_url(sheet['image']),
+                         sheet['columns'] * 100, sheet['rows'] * 100))
+        for name, (x, y) in sorted(sheet['positions'].items()):
+            lines.append('.sprite-{}-{}{{background-position:{:.4f}% {:.4f}%}}'.format(
+                kind, name, x, y))
+    return '\n'.join(lines) + '\n'
+
+
+def is_outdated(index):
+    index_path = _static_path(INDEX_FILE)
+    if not os.path.isfile(index_path) or not os.path.isfile(_static_path(CSS_FILE)):
+        return True
+    built = os.path.getmtime(index_path)
+    for kind in SHEETS:
+        sources = get_sources(kind)
+        if kind not in index or set(sources) != set(index[kind]['positions']):
+            return True
+        if any(os.path.getmtime(path) > built for path in sources.values()):
+            return True
+    return False
+
+
+def load_index():
+    try:
+        with open(_static_path(INDEX_FILE)) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def build():
+    """Rebuilds every sheet, the css and the index."""
+    if not os.path.isdir(_static_path(SPRITE_DIR)):
+        os.makedirs(_static_path(SPRITE_DIR))
+    index = {kind: build_sheet(kind) for kind in SHEETS}
+    _write_atomic(_static_path(CSS_FILE), build_css(index))
+    _write_atomic(_static_path(INDEX_FILE), json.dumps(index))
+    return index
+
+
+def get_css_url():
+    if not _index:
+        return None
+    return assets.static_url(CSS_FILE)
+
+
+def get_sprite_html(kind, name, width, height):
+    """Returns a span showing the sprite, or None if it isn't on a sheet."""
+    if name not in _index.get(kind, {}).get('positions', {}):
+        return None
+    html = '<span class="sprite-{0} sprite-{0}-{1}" style="width:{2}px;height:{3}px"></span>'
+    return Markup(html.format(kind, name, width, height))
+
+
+def init_app(app):
+    """Loads the sheets, (re)building them first if images were added.
+
+    Anything missing from the sheets (e.g. if Pillow isn't installed) is
+    shown as a plain <img> instead.
+    """
+    global _index
+    index = load_index()
+    if is_outdated(index):
+        try:
+            index = build()
+        except ImportError:
+            app.logger.info('Pillow is not installed, not rebuilding sprite sheets')
+        except (IOError, OSError) as e:
+            app.logger.error('Failed to build sprite sheets: {}'.format(e))
+
+    _index = index
+    app.jinja_env.globals.update(sprite_css_url=get_css_url)
@@ -0,0 +1,43 @@
+import unittest
+
+from . import get5_test
+from . import sprites
+from .models import Team
+
+
+class SpritesTests(get5_test.Get5Test):
+
+    def setUp(self):
+        super(SpritesTests, self).setUp()
+        self.saved_index = sprites._index
+        sprites._index = {
+            'flag': {
+                'image': 'img/sprites/flags.png',
+                'columns': 2,
+                'rows': 1,
+                'positions': {'fr': [0, 0], 'se': [100.0, 0]},
+            },
+        }
+
+    def tearDown(self):
+        sprites._index = self.saved_index
+        super(SpritesTests, self).tearDown()
+
+    def test_flag_html(self):
+        team = Team.query.get(1)
+        self.assertEqual(
+            team.get_flag_html(0.75),
+            '<span class="sprite-flag sprite-flag-fr" style="width:24px;height:16px"></span>')
+
+        # Flags missing from the sheet fall back to an image
+        team.flag = 'us'
+        self.assertIn('<img src="/static/img/valve_flags/us.png', team.get_flag_html())
+
+    def test_css(self):
+        css = sprites.build_css(sprites._index)
+        self.assertIn('background-size:200% 100%', css)
+        self.assertIn('.sprite-flag-se{background-position:100.0000% 0.0000%}', css)
+
+
+if __name__ == '__main__':
+    unittest.main()
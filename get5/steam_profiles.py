@@ -0,0 +1,117 @@
+import datetime
+import queue
+import time
+from threading import Thread
+
+from get5 import app, db, cache, config_setting
+from . import http_client
+from .models import User, Team, PlayerStats, SteamProfile
+
+# GetPlayerSummaries accepts at most 100 steamids per call.
+BATCH_SIZE = 100
+SUMMARIES_URL = 'http://api.steampowered.com/ISteamUser/GetPlayerSummaries/v0002/'
+
+
+def fetch_player_summaries(steam_ids):
+    """Returns a dict of steamid -> persona name for up to 100 steamids."""
+    response = http_client.get(SUMMARIES_URL, params={
+        'key': app.config['STEAM_API_KEY'],
+        'steamids': ','.join(steam_ids),
+    })
+    response.raise_for_status()
+    players = response.json()['response']['players']
+    return {player['steamid']: player['personaname'] for player in players}
+
+
+def get_known_steam_ids():
+    steam_ids = set()
+    for auths, in db.session.query(Team.auths):
+        steam_ids.update(auth for auth in (auths or []) if auth)
+    for steam_id, in db.session.query(PlayerStats.steam_id).distinct():
+        steam_ids.add(steam_id)
+    for steam_id, in db.session.query(User.steam_id):
+        steam_ids.add(steam_id)
+    steam_ids.discard(None)
+    return sorted(steam_ids)
+
+
+def refresh(steam_ids=None):
+    """Fetches and stores the persona names of the given (or all known) steamids."""
+    if steam_ids is None:
+        steam_ids = get_known_steam_ids()
+
+    max_length = SteamProfile.name.type.length
+    for i in range(0, len(steam_ids), BATCH_SIZE):
+        batch = steam_ids[i:i + BATCH_SIZE]
+        names = fetch_player_summaries(batch)
+        now = datetime.datetime.utcnow()
+
+        profiles = {p.steam_id: p for p in
+                    SteamProfile.query.filter(SteamProfile.steam_id.in_(batch))}
+        for steam_id, name in names.items():
+            profile = profiles.get(steam_id)
+            if profile is None:
+                profile = SteamProfile(steam_id=steam_id)
+                db.session.add(profile)
+            profile.name = name[:max_length]
+            profile.updated = now
+
+        for user in User.query.filter(User.steam_id.in_(list(names))):
+            user.name = names[user.steam_id][:max_length]
+        db.session.commit()
+
+
+class SteamProfileRefresher(Thread):
+    """Refreshes all known persona names every interval seconds.
+
+    Steamids passed to request_refresh (e.g. of a newly saved team) are
+    fetched right away. Only one worker per cache does the periodic full
+    refresh.
+    """
+
+    def __init__(self, interval):
+        super().__init__()
+        self.daemon = True
+        self.interval = interval
+        self.task_queue = queue.Queue()
+
+    def request_refresh(self, steam_ids):
+        steam_ids = [steam_id for steam_id in steam_ids if steam_id]
+        if steam_ids:
+            self.task_queue.put(steam_ids)
+
+    def run(self):
+        next_full_refresh = time.time()
+        while True:
+            try:
+                steam_ids = self.task_queue.get(
+                    timeout=max(0, next_full_refresh - time.time()))
+            except queue.Empty:
+                next_full_refresh = time.time() + self.interval
+                if not cache.add('steam_profile_refresh_lock', True, timeout=self.interval):
+                    continue
+                steam_ids = None
+
+            with app.app_context():
+                try:
+                    refresh(steam_ids)
+                except Exception as e:
+                    app.logger.error('Failed to refresh steam profiles: {}'.format(e))
+                finally:
+                    db.session.remove()
+
+
+refresher = None
+
+
+def init_app(app):
+    global refresher
+    interval = config_setting('STEAM_PROFILE_REFRESH_INTERVAL')
+    if interval and not config_setting('TESTING'):
+        refresher = SteamProfileRefresher(interval)
+        refresher.start()
+
+
+def request_refresh(steam_ids):
+    if refresher is not None:
+        refresher.request_refresh(steam_ids)
@@ -1,9 +1,22 @@
 from valve.steam.id import SteamID, SteamIDError
-import requests
 
+from concurrent import futures
 import re
+import threading
+import time
 from lxml import etree
 
+from . import http_client
+
+# Resolved custom urls are cached, as well as (for a shorter time) urls that
+# don't belong to any profile. Failed requests are never cached.
+VANITY_CACHE_TTL = 60 * 60 * 24
+VANITY_NEGATIVE_CACHE_TTL = 60 * 10
+VANITY_CACHE_MAX_SIZE = 10000
+
+_vanity_cache = {}
+_vanity_cache_lock = threading.Lock()
+
 
 def steam2_to_steam64(steam2):
     try:
@@ -37,16 +50,52 @@ def steam64_from_xml(xml):
         return False, ''
 
 
+def _vanity_cache_key(url):
+    key = url.strip().lower().replace('?xml=1', '').rstrip('/')
+    return key.split('://', 1)[-1]
+
+
+def _vanity_cache_get(key):
+    with _vanity_cache_lock:
+        entry = _vanity_cache.get(key)
+    if entry is None:
+        return None
+
+    expires, result = entry
+    if expires < time.time():
+        return None
+    return result
+
+
+def _vanity_cache_set(key, result):
+    ttl = VANITY_CACHE_TTL if result[0] else VANITY_NEGATIVE_CACHE_TTL
+    with _vanity_cache_lock:
+        if len(_vanity_cache) >= VANITY_CACHE_MAX_SIZE:
+            now = time.time()
+            for k in [k for k, (expires, _) in _vanity_cache.items() if expires < now]:
+                del _vanity_cache[k]
+            if len(_vanity_cache) >= VANITY_CACHE_MAX_SIZE:
+                _vanity_cache.clear()
+        _vanity_cache[key] = (time.time() + ttl, result)
+
+
 def custom_url_to_steam3(url):
+    key = _vanity_cache_key(url)
+    cached = _vanity_cache_get(key)
+    if cached is not None:
+        return cached
+
     if '?xml=1' not in url:
         url += '?xml=1'
 
     try:
-        xml = etree.fromstring(requests.get(url).content)
+        xml = etree.fromstring(http_client.get(url).content)
     except Exception:
         return False, ''
 
-    return steam64_from_xml(xml)
+    result = steam64_from_xml(xml)
+    _vanity_cache_set(key, result)
+    return result
 
 
 def custom_name_to_steam3(name):
@@ -85,6 +134,36 @@ def auth_to_steam64(auth):
         return custom_name_to_steam3(auth)
 
 
+def resolve_auths(auths, timeout=None):
+    """Converts several auths to steam64 at once.
+
+    Returns a dict mapping each non-empty auth to the (success, steam64) tuple
+    auth_to_steam64 would return. Custom urls each need a request to steam, so
+    all auths are resolved concurrently and any lookup that hasn't finished
+    after timeout seconds counts as invalid.
+    """
+    unique_auths = {auth for auth in auths if auth}
+    results = {}
+    if not unique_auths:
+        return results
+
+    executor = futures.ThreadPoolExecutor(max_workers=len(unique_auths))
+    try:
+        pending = {executor.submit(auth_to_steam64, auth): auth for auth in unique_auths}
+        done, not_done = futures.wait(pending, timeout=timeout)
+        for future in done:
+            try:
+                results[pending[future]] = future.result()
+            except Exception:
+                results[pending[future]] = (False, '')
+        for future in not_done:
+            results[pending[future]] = (False, '')
+    finally:
+        executor.shutdown(wait=False)
+
+    return results
+
+
 def is_valid_steamid(auth):
     valid, _ = auth_to_steam64(auth)
     return valid
@@ -96,5 +175,5 @@ def get_steam_userinfo(steamid, api_key):
         'steamids': steamid,
     }
     url = 'http://api.steampowered.com/ISteamUser/GetPlayerSummaries/v0001'
-    rv = requests.get(url, params=options).json()
+    rv = http_client.get(url, params=options).json()
     return rv['response']['players']['player'][0] or {}
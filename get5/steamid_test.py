@@ -1,4 +1,5 @@
 import unittest
+from unittest import mock
 
 from . import steamid
 from . import get5_test
@@ -67,6 +68,30 @@ class SteamIdTests(get5_test.Get5Test):
         self.assertTrue(suc)
         self.assertEqual(actual, expected)
 
+    def test_resolve_auths(self):
+        results = steamid.resolve_auths(
+            ['STEAM_0:1:52245092', '', '76561198064755913', '[U:1:0]'])
+        self.assertEqual(results, {
+            'STEAM_0:1:52245092': (True, '76561198064755913'),
+            '76561198064755913': (True, '76561198064755913'),
+            '[U:1:0]': (False, ''),
+        })
+
+    @mock.patch('get5.http_client.get')
+    def test_custom_url_cache(self, get):
+        get.return_value.content = b'<profile><steamID64>76561198064755913</steamID64></profile>'
+        url = 'http://steamcommunity.com/id/cached_test_name'
+        self.assertEqual(steamid.auth_to_steam64(url), (True, '76561198064755913'))
+        self.assertEqual(steamid.auth_to_steam64(url + '/'), (True, '76561198064755913'))
+        self.assertEqual(get.call_count, 1)
+
+        # Misses are cached too
+        get.return_value.content = b'<response><error>not found</error></response>'
+        url = 'http://steamcommunity.com/id/missing_test_name'
+        self.assertEqual(steamid.auth_to_steam64(url), (False, ''))
+        self.assertEqual(steamid.auth_to_steam64(url), (False, ''))
+        self.assertEqual(get.call_count, 2)
+
 
 if __name__ == '__main__':
     unittest.main()
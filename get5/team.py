@@ -1,8 +1,11 @@
-from get5 import app, db, flash_errors, config_setting
-from .models import User, Team
+from get5 import app, db, flash_errors, config_setting, BadRequestError
+from .models import User, Team, MetricCounter, TeamRating, TeamMapStats, HeadToHead
 
+from . import brackets
 from . import countries
+from . import fragments
 from . import logos
+from . import steam_profiles
 from . import steamid
 from . import util
 
@@ -15,14 +18,21 @@ from wtforms import (
 
 team_blueprint = Blueprint('team', __name__)
 
+SEARCH_RESULTS = 20
+
 
 def valid_auth(form, field):
     # Ignore empty data fields
     if field.data is None or field.data == '':
         return
 
-    # Otherwise validate and coerce to steam64
-    suc, newauth = steamid.auth_to_steam64(field.data)
+    # Otherwise validate and coerce to steam64, using the results TeamForm
+    # already resolved for the whole roster if possible
+    resolved = getattr(form, 'resolved_auths', {})
+    if field.data in resolved:
+        suc, newauth = resolved[field.data]
+    else:
+        suc, newauth = steamid.auth_to_steam64(field.data)
     if suc:
         field.data = newauth
     else:
@@ -54,6 +64,13 @@ class TeamForm(Form):
     open_join = BooleanField('Allow users to join team')
     public_team = BooleanField('Public Team')
 
+    def validate(self):
+        # Resolve all players together, custom urls need a request to steam each.
+        self.resolved_auths = steamid.resolve_auths(
+            [self.data['auth{}'.format(i)] for i in range(1, 8)],
+            timeout=config_setting('STEAM_RESOLVE_TIMEOUT'))
+        return super().validate()
+
     def get_auth_list(self):
         auths = []
         for i in range(1, 8):
@@ -87,6 +104,7 @@ def team_create():
                                open_join=data['open_join'])
 
             db.session.commit()
+            steam_profiles.request_refresh(auths)
             app.logger.info(
                 'User {} created team {}'.format(g.user.id, team.id))
 
@@ -103,7 +121,17 @@ def team_create():
 def team(teamid):
     team = Team.query.get_or_404(teamid)
     tournament_list = team.tournaments
-    return render_template('team.html', user=g.user, team=team, tournament_list=tournament_list)
+    return render_template('team.html', user=g.user, team=team, tournament_list=tournament_list,
+                           map_results=TeamMapStats.get_for_team(team.id),
+                           fragment_timeout=config_setting('FRAGMENT_CACHE_TIMEOUT'))
+
+
+@team_blueprint.route('/team/<int:teamid>/vs/<int:otherid>', methods=['GET'])
+def team_vs(teamid, otherid):
+    team = Team.query.get_or_404(teamid)
+    other_team = Team.query.get_or_404(otherid)
+    return render_template('team_vs.html', user=g.user, team=team, other_team=other_team,
+                           record=HeadToHead.get_record(team.id, other_team.id))
 
 
 @team_blueprint.route('/team/<int:teamid>/join', methods=['GET'])
@@ -120,6 +148,8 @@ def team_join(teamid):
         auths[auths.index('')] = g.user.steam_id
         team.auths = auths
         db.session.commit()
+        steam_profiles.request_refresh([g.user.steam_id])
+        fragments.invalidate('team', team.id)
     else:
         flash('You are already a part of this team', 'warning')
     return redirect(url_for('team.team', teamid=teamid))
@@ -161,6 +191,10 @@ def team_edit(teamid):
                               data['public_team'] and g.user.admin,
                               data['open_join'])
                 db.session.commit()
+                steam_profiles.request_refresh(team.auths)
+                fragments.invalidate('team', team.id)
+                for tournament in team.tournaments:
+                    brackets.invalidate(tournament.id)
                 return redirect(url_for('team.team', teamid=teamid))
             else:
                 flash_errors(form)
@@ -175,7 +209,13 @@ def team_delete(teamid):
     if not team.can_delete(g.user):
         return 'Cannot delete this team', 400
     team.tournaments.clear()
+    TeamRating.query.filter_by(team_id=teamid).delete()
+    TeamMapStats.query.filter_by(team_id=teamid).delete()
+    HeadToHead.query.filter(
+        (HeadToHead.team_a_id == teamid) | (HeadToHead.team_b_id == teamid)).delete(
+        synchronize_session=False)
     if Team.query.filter_by(id=teamid).delete():
+        MetricCounter.increment('teams', -1)
         db.session.commit()
 
     return redirect(url_for('team.teams', userid=g.user.id))
@@ -207,6 +247,31 @@ def teams_user(userid):
                                page=page, owner=user)
 
 
+@team_blueprint.route('/teams/search', methods=['GET'])
+def teams_search():
+    """Teams usable in a match whose name starts with ?q=, for the match form."""
+    if not g.user:
+        raise BadRequestError('You must be logged in')
+
+    query = Team.query.filter(
+        (Team.public_team == True) | (Team.user_id == g.user.id))  # noqa: E712
+    prefix = request.values.get('q', '').strip()
+    if prefix:
+        # Served by the lower(name) index on Postgres, see migration 2e7d9a4c6b15.
+        query = query.filter(db.func.lower(Team.name).like(
+            util.like_prefix(prefix.lower()), escape='\\'))
+
+    teams = query.order_by(Team.name).limit(SEARCH_RESULTS)
+    return jsonify({'results': [{'id': team.id, 'name': team.name} for team in teams]})
+
+
+@team_blueprint.route('/rankings', methods=['GET'])
+def rankings():
+    page = util.as_int(request.values.get('page'), on_fail=1)
+    rankings = TeamRating.get_rankings().paginate(page, 50)
+    return render_template('rankings.html', user=g.user, rankings=rankings, page=page)
+
+
 @team_blueprint.route('/teams', methods=['GET'])
 def teams():
     page = util.as_int(request.values.get('page'), on_fail=1)
@@ -1,9 +1,13 @@
+import json
 import unittest
+from unittest import mock
 
 from flask import url_for
 
 from . import get5_test
-from .models import User, Team
+from . import steam_profiles
+from get5 import db
+from .models import User, Team, SteamProfile, MetricCounter, Match, HeadToHead
 
 
 class TeamTests(get5_test.Get5Test):
@@ -52,6 +56,7 @@ class TeamTests(get5_test.Get5Test):
         self.assertEqual(team.flag, 'se')
         self.assertEqual(team.auths[0], '76561198064755913')
         self.assertTrue(team in User.query.get(1).teams)
+        self.assertEqual(MetricCounter.get_values()['teams'], 3)
 
         # Should be able to render the teams page
         self.assertEqual(self.app.get('/teams/1').status_code, 200)
@@ -92,6 +97,35 @@ class TeamTests(get5_test.Get5Test):
             self.assertEqual(response.status_code, 302)
         team = Team.query.get(3)
         self.assertIsNone(team)
+        self.assertEqual(MetricCounter.get_values()['teams'], 2)
+
+    def test_teams_search(self):
+        # Must be logged in
+        self.assertEqual(self.app.get('/teams/search?q=E').status_code, 400)
+
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 1
+            response = c.get('/teams/search?q=En')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(json.loads(response.get_data().decode('utf8')),
+                             {'results': [{'id': 1, 'name': 'EnvyUs'}]})
+
+            # Case doesn't matter
+            response = c.get('/teams/search?q=fNAT')
+            self.assertEqual(json.loads(response.get_data().decode('utf8')),
+                             {'results': [{'id': 2, 'name': 'Fnatic'}]})
+
+            # Wildcards are matched literally
+            response = c.get('/teams/search?q=%25')
+            self.assertEqual(json.loads(response.get_data().decode('utf8')), {'results': []})
+
+        # Private teams of other users aren't listed
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 2
+            response = c.get('/teams/search?q=')
+            self.assertEqual(json.loads(response.get_data().decode('utf8')), {'results': []})
 
     # Make sure a user can't edit someone else's teams
     def test_edit_team_wronguser(self):
@@ -164,6 +198,48 @@ class TeamTests(get5_test.Get5Test):
         self.assertEqual(team.public_team, True)
         self.assertTrue(team in User.query.get(1).teams)
 
+    def test_head_to_head(self):
+        self.assertIsNone(HeadToHead.get_record(1, 2))
+        self.assertEqual(self.app.get('/team/1/vs/2').status_code, 200)
+
+        match = Match.query.get(1)
+        data = {'mapname': 'de_dust2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/start', data=data).status_code, 200)
+        data = {'winner': 'team2', 'key': match.api_key}
+        self.assertEqual(self.app.post('/match/1/map/0/finish', data=data).status_code, 200)
+        self.assertEqual(self.app.post('/match/1/finish', data=data).status_code, 200)
+
+        record = HeadToHead.get_record(2, 1)
+        self.assertEqual((record['series_won'], record['series_lost']), (1, 0))
+        self.assertEqual((record['maps_won'], record['maps_lost']), (1, 0))
+        self.assertEqual(record['last_match_id'], 1)
+
+        data = json.loads(self.app.get('/api/v1/teams/1/vs/2').get_data().decode('utf8'))
+        self.assertEqual((data['series_won'], data['series_lost']), (0, 1))
+        self.assertEqual((data['maps_won'], data['maps_lost']), (0, 1))
+        self.assertEqual(self.app.get('/team/1/vs/2').status_code, 200)
+
+    def test_get_players(self):
+        team = Team.query.get(1)
+        self.assertEqual(team.get_players(), [('76561198053858673', '')])
+
+        db.session.add(SteamProfile(steam_id='76561198053858673', name='splewis'))
+        db.session.commit()
+        self.assertEqual(team.get_players(), [('76561198053858673', 'splewis')])
+
+    @mock.patch('get5.steam_profiles.fetch_player_summaries')
+    def test_refresh_steam_profiles(self, fetch):
+        fetch.return_value = {'76561198053858673': 'splewis', '123': 'user'}
+        steam_profiles.refresh()
+        self.assertEqual(fetch.call_count, 1)
+        self.assertEqual(sorted(fetch.call_args[0][0]), ['123', '12345', '76561198053858673'])
+        self.assertEqual(SteamProfile.query.get('76561198053858673').name, 'splewis')
+
+        fetch.return_value = {'76561198053858673': 'splewis2'}
+        steam_profiles.refresh(['76561198053858673'])
+        self.assertEqual(SteamProfile.query.get('76561198053858673').name, 'splewis2')
+        self.assertEqual(SteamProfile.query.count(), 2)
+
 
 if __name__ == '__main__':
     unittest.main()
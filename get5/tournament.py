@@ -8,6 +8,7 @@ import get5
 from get5 import app, db, BadRequestError, config_setting
 from .models import User, Team, Match, GameServer, Tournament
 from . import util
+from . import brackets
 from . import challonge
 
 from wtforms import (
@@ -95,7 +96,8 @@ def tournament_create():
 
             if reply['id']:
                 t = Tournament.create(g.user, reply['name'], reply['full_challonge_url'],
-                                      challonge_id=reply['id'], challonge_data=reply,
+                                      challonge_id=reply['id'],
+                                      challonge_data=challonge.compact_tournament_data(reply),
                                       veto_mappool=form.data['veto_mappool'],
                                       serverpool=form.serverpool.data)
 
@@ -113,25 +115,23 @@ def tournament_create():
 @tournament_blueprint.route('/tournament/<int:tournamentid>')
 def tournament(tournamentid):
     tournament = Tournament.query.get_or_404(tournamentid)
-    participants = tournament.participants.all()
-    matches = tournament.matches.all()
-    pending_matches = [match for match in matches if match.pending()]
-    live_matches = [match for match in matches if match.live()]
-    finished_matches = [match for match in matches if match.finished()]
-    serverpool = tournament.serverpool.all()
+    bracket = brackets.get_snapshot(tournament)
 
     is_owner = False
     has_admin_access = False
+    serverpool = []
 
     if g.user:
         is_owner = (g.user.id == tournament.user_id)
         has_admin_access = is_owner or (config_setting(
             'ADMINS_ACCESS_ALL_TOURNAMENTS') and g.user.admin)
+        if has_admin_access:
+            serverpool = tournament.serverpool.all()
 
     return render_template('tournament.html', user=g.user, admin_access=has_admin_access,
-                           tournament=tournament, participants=participants,
-                           live_matches=live_matches, finished_matches=finished_matches,
-                           pending_matches=pending_matches, serverpool=serverpool)
+                           tournament=tournament, participants=bracket['participants'],
+                           live_matches=bracket['live'], finished_matches=bracket['finished'],
+                           pending_matches=bracket['pending'], serverpool=serverpool)
 
 
 @tournament_blueprint.route('/tournament/<int:tournamentid>/sync')
@@ -139,31 +139,59 @@ def tournament_sync(tournamentid):
     tournament = Tournament.query.get_or_404(tournamentid)
     admintools_check(g.user, tournament)
     try:
-        reply = chall.tournament(tournament.challonge_id, include_participants=True, include_matches=True)
+        reply = chall.cached_tournament(tournament.challonge_id)
         reply = reply['tournament']
     except challonge.ChallongeException as e:
         flash(str(e), 'danger')
     else:
+        if 'participants' in reply.keys() and reply['participants']:
+            sync_participants(tournament, [p['participant'] for p in reply['participants']],
+                              _previous_snapshot(tournament, 'participants'))
+        if 'matches' in reply.keys() and reply['matches']:
+            sync_matches(tournament, [m['match'] for m in reply['matches']],
+                         _previous_snapshot(tournament, 'matches'))
         tournament.name = reply['name']
         tournament.url = reply['full_challonge_url']
-        tournament.challonge_data = reply
+        tournament.challonge_data = challonge.compact_tournament_data(reply)
         db.session.commit()
-        if 'participants' in reply.keys() and reply['participants']:
-            sync_participants(tournament, [p['participant'] for p in reply['participants']])
-        if 'matches' in reply.keys() and reply['matches']:
-            sync_matches(tournament, [m['match'] for m in reply['matches']])
+        brackets.invalidate(tournament.id)
     return redirect(url_for('tournament.tournament', tournamentid=tournamentid))
 
 
-def sync_participants(tournament, participants):
-    t_participant_ids = {p.id for p in tournament.participants.all()}
+def _previous_snapshot(tournament, kind):
+    """The id -> updated_at map of participants or matches saved on the last sync.
+
+    Tournaments created before these snapshots existed hold the full challonge
+    reply instead, which is treated as no snapshot, i.e. everything is synced.
+    """
+    data = tournament.challonge_data
+    if not isinstance(data, dict) or not isinstance(data.get(kind), dict):
+        return {}
+    return data[kind]
+
+
+def _changed_since(item, previous):
+    """Whether a challonge participant or match was added or updated since
+    the snapshot previous (a dict of id -> updated_at) was taken."""
+    return previous.get(item['id']) != item.get('updated_at')
+
+
+def sync_participants(tournament, participants, previous=None):
+    previous = previous or {}
+    # Participants without a linked team are retried until they have one.
+    changed = [p for p in participants if p['misc'] is None or _changed_since(p, previous)]
+    removed = set(previous).difference(p['id'] for p in participants)
+    if previous and not changed and not removed:
+        return
+
+    t_participants = {p.id: p for p in tournament.participants.all()}
+    t_participant_ids = set(t_participants)
     c_participant_ids = {int(p['misc']) for p in participants if p['misc'] is not None}
     for team_id in t_participant_ids.difference(c_participant_ids):
-        team = Team.query.get(team_id)
-        tournament.participants.remove(team)
+        tournament.participants.remove(t_participants[team_id])
         db.session.commit()
 
-    for participant in participants:
+    for participant in changed:
         if participant['misc'] is None:
             _create_and_add_participant(tournament, participant)
         elif int(participant['misc']) not in t_participant_ids:
@@ -190,15 +218,21 @@ def _create_and_add_participant(tournament, participant):
         db.session.commit()
 
 
-def sync_matches(tournament, challonge_matches):
-    t_match_ids = {m.challonge_id for m in tournament.matches.all()}
+def sync_matches(tournament, challonge_matches, previous=None):
+    previous = previous or {}
+    changed = [m for m in challonge_matches if _changed_since(m, previous)]
+    removed = set(previous).difference(m['id'] for m in challonge_matches)
+    if previous and not changed and not removed:
+        return
+
+    t_matches = {m.challonge_id: m for m in tournament.matches.all()}
+    t_match_ids = set(t_matches)
     c_match_ids = {m['id'] for m in challonge_matches}
     for match_challonge_id in t_match_ids.difference(c_match_ids):
-        match = Match.query.filter_by(challonge_id=match_challonge_id).first()
-        tournament.matches.remove(match)
+        tournament.matches.remove(t_matches[match_challonge_id])
         db.session.commit()
 
-    for match_dict in challonge_matches:
+    for match_dict in changed:
         if match_dict['id'] not in t_match_ids:
             _create_and_add_match(tournament, match_dict)
 
@@ -242,9 +276,10 @@ def tournament_start(tournamentid):
         flash(e.message)
     else:
         tournament.start_time = datetime.datetime.utcnow()
-        tournament.challonge_data = data['tournament']
+        tournament.challonge_data = challonge.compact_tournament_data(data['tournament'])
         db.session.commit()
         sync_matches(tournament, [d['match'] for d in data['tournament']['matches']])
+        brackets.invalidate(tournament.id)
 
     return redirect(url_for('tournament.tournament', tournamentid=tournamentid))
 
@@ -259,8 +294,9 @@ def tournament_reset(tournamentid):
         flash(e.message)
     else:
         tournament.start_time = None
-        tournament.challonge_data = data['tournament']
+        tournament.challonge_data = challonge.compact_tournament_data(data['tournament'])
         db.session.commit()
+        brackets.invalidate(tournament.id)
 
     # TODO handle pending matches
 
@@ -274,6 +310,7 @@ def tournament_cancel(tournamentid):
     tournament.cancelled = True
 
     db.session.commit()
+    brackets.invalidate(tournament.id)
 
     # TODO cancel all matches!
 
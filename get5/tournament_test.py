@@ -0,0 +1,51 @@
+import unittest
+from unittest import mock
+
+from . import get5_test
+from get5 import db
+from .models import User, Team, Tournament
+
+
+class TournamentTests(get5_test.Get5Test):
+
+    def challonge_reply(self):
+        participants = [
+            {'participant': {'id': 11, 'misc': '1', 'name': 'EnvyUs', 'display_name': 'EnvyUs',
+                             'updated_at': '2017-08-01T10:00:00'}},
+            {'participant': {'id': 12, 'misc': '2', 'name': 'Fnatic', 'display_name': 'Fnatic',
+                             'updated_at': '2017-08-01T10:00:00'}},
+        ]
+        matches = [
+            {'match': {'id': 21, 'player1_id': 11, 'player2_id': 12, 'identifier': 'A',
+                       'round': 1, 'updated_at': '2017-08-01T10:00:00'}},
+        ]
+        return {'tournament': {'id': 5, 'name': 'Cup', 'full_challonge_url': 'http://cup',
+                               'participants': participants, 'matches': matches}}
+
+    # Tournaments created before compact snapshots kept the whole reply
+    @mock.patch('get5.tournament.chall')
+    def test_sync_legacy_challonge_data(self, chall):
+        reply = self.challonge_reply()
+        chall.cached_tournament.return_value = reply
+        for team_id, challonge_id in [(1, 11), (2, 12)]:
+            Team.query.get(team_id).challonge_id = challonge_id
+        tournament = Tournament.create(User.query.get(1), 'Cup', 'http://cup', ['de_dust2'],
+                                       challonge_id=5, challonge_data=reply['tournament'])
+        db.session.commit()
+        tid = tournament.id
+
+        with self.app as c:
+            with c.session_transaction() as sess:
+                sess['user_id'] = 1
+            response = c.get('/tournament/{}/sync'.format(tid))
+            self.assertEqual(response.status_code, 302)
+
+        tournament = Tournament.query.get(tid)
+        self.assertEqual(sorted(t.id for t in tournament.participants), [1, 2])
+        self.assertEqual([m.challonge_id for m in tournament.matches], [21])
+        self.assertEqual(tournament.challonge_data['participants'],
+                         {11: '2017-08-01T10:00:00', 12: '2017-08-01T10:00:00'})
+
+
+if __name__ == '__main__':
+    unittest.main()
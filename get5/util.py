@@ -12,6 +12,20 @@ def as_int(val, on_fail=0):
         return on_fail
 
 
+def _like_escape(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def like_prefix(value):
+    """Returns a LIKE pattern (escaped with a backslash) matching anything starting with value."""
+    return _like_escape(value) + '%'
+
+
+def like_contains(value):
+    """Returns a LIKE pattern (escaped with a backslash) matching anything containing value."""
+    return '%' + _like_escape(value) + '%'
+
+
 def format_mapname(mapname):
     formatted_names = {
         'de_cbble': 'Cobblestone',
@@ -0,0 +1,37 @@
+"""case insensitive prefix search indexes on postgres
+
+Revision ID: 2e7d9a4c6b15
+Revises: f3a8c2d91b07
+Create Date: 2026-10-19 21:40:18.662031
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '2e7d9a4c6b15'
+down_revision = 'f3a8c2d91b07'
+
+from alembic import op
+import sqlalchemy as sa
+
+# The plain indexes can't serve LIKE 'q%' unless the database uses the C
+# collation, varchar_pattern_ops indexes always can.
+PREFIX_INDEXES = [
+    ('ix_team_name_prefix', 'team', 'name'),
+    ('ix_game_server_display_name_prefix', 'game_server', 'display_name'),
+    ('ix_game_server_ip_string_prefix', 'game_server', 'ip_string'),
+]
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table, column in PREFIX_INDEXES:
+        op.execute('CREATE INDEX {} ON "{}" (lower({}) varchar_pattern_ops)'.format(
+            name, table, column))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, _, _ in PREFIX_INDEXES:
+        op.execute('DROP INDEX {}'.format(name))
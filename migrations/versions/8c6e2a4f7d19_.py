@@ -0,0 +1,37 @@
+"""add full text search indexes on postgres
+
+Revision ID: 8c6e2a4f7d19
+Revises: 5f3b9e6d0c21
+Create Date: 2026-10-19 18:31:57.120448
+
+"""
+
+# revision identifiers, used by Alembic.
+revision = '8c6e2a4f7d19'
+down_revision = '5f3b9e6d0c21'
+
+from alembic import op
+import sqlalchemy as sa
+
+# These expressions must match search._document exactly.
+SEARCH_INDEXES = [
+    ('ix_team_search', 'team', "coalesce(name, '') || ' ' || coalesce(tag, '')"),
+    ('ix_player_search', 'player', "coalesce(name, '')"),
+    ('ix_match_search', 'match', "coalesce(title, '')"),
+]
+
+
+def upgrade():
+    # Other databases fall back to LIKE queries, which can't use an index.
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, table, document in SEARCH_INDEXES:
+        op.execute('CREATE INDEX {} ON "{}" USING gin (to_tsvector(\'simple\', {}))'.format(
+            name, table, document))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for name, _, _ in SEARCH_INDEXES:
+        op.execute('DROP INDEX {}'.format(name))